@@ -4,6 +4,7 @@ import os
 import platform
 import sys
 import math
+import time
 
 import asyncpg
 import discord
@@ -14,8 +15,12 @@ from dotenv import load_dotenv
 
 from utils import command_tree
 
-from database import DatabaseManager
+from database import DatabaseManager, migrations
 from utils import roblox
+from utils.cache import PersistentCache
+from utils.http import HTTPClient
+from utils.tracker import PollScheduler, TrackerNotifier, TrackerState, WatchRules
+from utils import ratelimit
 
 if not os.path.isfile(f"{os.path.realpath(os.path.dirname(__file__))}/config.json"):
     sys.exit("'config.json' not found! Please add it and try again.")
@@ -97,6 +102,12 @@ class DiscordBot(commands.Bot):
         self.config = config
         self.database = None
         self.db_pool = None
+        self.http_client = None
+        self.lookup_cache = None
+        self.tracker = None
+        self.tracker_scheduler = None
+        self.tracker_notifier = None
+        self.watch_rules = None
 
     async def init_db(self) -> None:
         self.db_pool = await asyncpg.create_pool(
@@ -107,13 +118,9 @@ class DiscordBot(commands.Bot):
             port=os.getenv('POSTGRES_PORT')
         )
 
-        # Read the SQL file
-        with open('./database/schema.sql', 'r') as f:
-            sql = f.read()
-
-        # Execute the SQL commands
-        async with self.db_pool.acquire() as conn:
-            await conn.execute(sql)
+        # Apply the migrations that weren't applied yet
+        for migration in await migrations.migrate(self.db_pool):
+            self.logger.info(f"Applied migration '{migration}'")
 
         self.database = DatabaseManager(connection=self.db_pool)
 
@@ -169,98 +176,149 @@ class DiscordBot(commands.Bot):
         channel = await bot.fetch_channel(self.config['channels']['general'])
         await channel.send("<@1134427767283396639> You are dirty jew.")
 
-    @tasks.loop(minutes=1.0)
+    @tasks.loop(seconds=15.0)
     async def check_tracker(self) -> None:
         """
-        Check if any tracked users are online/offline and post it.
+        Poll the tracker and record how long it took against the loop interval.
         """
 
-        tracked_users = await bot.database.get_tracked_users()
-        tracked_users_dict = {int(user['roblox_id']): user for user in tracked_users}
+        started = time.monotonic()
 
-        if len(tracked_users) == 0:
-            return
+        try:
+            await self.poll_tracker()
+        finally:
+            self.tracker_scheduler.record_cycle(time.monotonic() - started, self.check_tracker.seconds)
 
-        user_ids = []
+    async def poll_tracker(self) -> None:
+        """
+        Check if any tracked users that are due a poll are online/offline and post it.
+        """
 
-        for x in tracked_users:
-            user_ids.append(int(x['roblox_id']))
+        # Without change notifications, the tracked users could have changed at any time
+        if not self.database.listening:
+            self.tracker.invalidate()
 
-        user_presences = await roblox.get_user_presences_by_ids(user_ids)
-        user_names = await roblox.get_users_by_ids(user_ids)
+        tracked_users_dict = await self.tracker.load()
 
-        try:
-            user_names = user_names['data']
-        except:
-            logger.error("Unknown error occured when fetching users by ids.")
-            return # Probably a 429 error
-        
-        try:
-            user_presences = user_presences['userPresences']
-        except:
-            logger.info("Check tracker hit a 429 error.")
-            return 
-        
-        tracker_post_channel = await bot.fetch_channel(self.config['channels']['tracker_post'])
+        self.tracker_scheduler.sync(tracked_users_dict)
 
-        if not tracker_post_channel:
-            logger.critical("Cannot find tracker post channel.")
+        user_ids = self.tracker_scheduler.due()
+
+        if len(user_ids) == 0:
             return
 
-        for i, presence in enumerate(user_presences):
-            embed = None
-
-            game_id = presence['gameId']
-            place_id = presence['rootPlaceId']
-            last_location = presence['lastLocation']
-            
-            roblox_id = presence['userId']
-            user_name = list(filter(lambda name: name['id'] == roblox_id, user_names))
-            user_name = user_name[0]['name']
-            is_posted = tracked_users_dict[roblox_id]['posted']
-
-            if presence['userPresenceType'] == 2: # user is playing a game
-                if not place_id and not is_posted: # user has joins off and wasn't posted
-                    embed = discord.Embed(
-                        description=f"[{user_name}]({await roblox.profile(roblox_id)}) is playing a game. Their joins are off.",
-                        color=discord.Color.green(),
-                    )
+        # Let slash commands go ahead of the tracker when the ROBLOX budget runs low
+        try:
+            with ratelimit.background():
+                user_presences = await roblox.get_user_presences_by_ids(user_ids)
+                users = await roblox.get_users_by_ids(user_ids)
+        except roblox.UpstreamUnavailable as e:
+            logger.warning(f"Skipping tracker check: {e}")
+            return
 
-                    await bot.database.modify_tracked_user(str(roblox_id), True)
-                elif place_id and not is_posted: # user has joins on and wasn't posted
-                    if place_id == 4238077359:
-                        print(place_id, is_posted)
-                        embed = discord.Embed(
-                            description=f"[{user_name}]({await roblox.profile(roblox_id)}) is playing Coruscant.",
-                            color=discord.Color.green()
-                        )
-
-                        await bot.database.modify_tracked_user(str(roblox_id), True)
-                elif place_id and is_posted:
-                    if place_id != 4238077359:
-                        embed = discord.Embed(
-                            description=f"[{user_name}]({await roblox.profile(roblox_id)}) has left Coruscant.",
-                            color=discord.Color.red()
-                        )
-
-                    await bot.database.modify_tracked_user(str(roblox_id), False)
-            else:
-                if is_posted:
-                    embed = discord.Embed(
-                        description=f"[{user_name}]({await roblox.profile(roblox_id)}) has left {'Coruscant' if place_id else 'their game'}.",
-                        color=discord.Color.red()
-                    )
+        self.tracker_scheduler.postpone([roblox_id for roblox_id in user_ids if roblox_id not in user_presences])
+
+        posts = []
+
+        for roblox_id, presence in user_presences.items():
+            place_id = presence.root_place_id
+
+            user = users.get(roblox_id)
+
+            if roblox_id not in tracked_users_dict:
+                continue
+
+            if not user:
+                self.tracker_scheduler.postpone([roblox_id])
+                continue
+
+            changed = self.tracker.changed(presence)
+
+            self.tracker_scheduler.record(presence, changed=changed)
+
+            # Nothing to post unless the presence changed since the last check
+            if not changed:
+                continue
+
+            user_name = user.name
+            tracked_user = tracked_users_dict[roblox_id]
+            is_posted = tracked_user['posted']
+
+            posted_rule = self.watch_rules.get(tracked_user['posted_rule'])
+            rule = self.watch_rules.classify(presence)
 
-                    await bot.database.modify_tracked_user(str(roblox_id), False)
+            if is_posted and presence.in_game and not place_id:
+                continue # user has joins off, so they may still be in the game they were posted for
 
-            if embed:
-                embed.add_field(name="Reason", value=tracked_users[i]['reason'])
-                embed.add_field(name="Admin", value=f"<@{tracked_users[i]['moderator_id']}>")
-                embed.add_field(name="Date Added", value=f"<t:{math.floor(tracked_users[i]['created_at'].timestamp())}:d>")
+            # Users posted before watch rules were recorded have no rule, so the one they are seen under is
+            # adopted without posting them again
+            if is_posted and tracked_user['posted_rule'] is None and rule:
+                self.tracker.set_posted(roblox_id, rule.name)
+                continue
 
-                embed.set_thumbnail(url=(await roblox.get_user_avatar(roblox_id)))
-                await tracker_post_channel.send(content="<@&1271353317431185438>", embed=embed)
+            if is_posted and (posted_rule is None or rule is not posted_rule): # user left the game they were posted for
+                embed = discord.Embed(
+                    description=f"[{user_name}]({await roblox.profile(roblox_id)}) {posted_rule.left() if posted_rule else 'has left their game.'}",
+                    color=discord.Color.red()
+                )
+
+                posts.append((roblox_id, embed, posted_rule))
+                self.tracker.set_posted(roblox_id, None)
+                is_posted = False
+
+            if rule and not is_posted: # user joined a watched game
+                embed = discord.Embed(
+                    description=f"[{user_name}]({await roblox.profile(roblox_id)}) {rule.playing()}",
+                    color=discord.Color.green()
+                )
+
+                posts.append((roblox_id, embed, rule))
+                self.tracker.set_posted(roblox_id, rule.name)
+
+        for roblox_id, embed, _ in posts:
+            tracked_user = tracked_users_dict[roblox_id]
+
+            embed.add_field(name="Reason", value=tracked_user['reason'][:1024]) # The limit of a field
+            embed.add_field(name="Admin", value=f"<@{tracked_user['moderator_id']}>")
+            embed.add_field(name="Date Added", value=f"<t:{math.floor(tracked_user['created_at'].timestamp())}:d>")
+
+        # Write every changed posted rule at once
+        try:
+            await self.tracker.flush()
+        except Exception as e:
+            logger.warning(f"Could not save the tracker state: {e}")
+
+        if not posts:
+            return
+
+        # Resolve the avatars of every post in one request
+        try:
+            with ratelimit.background():
+                avatars = await roblox.get_user_avatars([roblox_id for roblox_id, _, _ in posts])
+        except roblox.UpstreamUnavailable:
+            avatars = {} # Post without avatars rather than not at all
+
+        # Posted in the background, as few messages as possible
+        for roblox_id, embed, rule in posts:
+            embed.set_thumbnail(url=avatars.get(roblox_id))
+
+            if rule:
+                self.tracker_notifier.put(rule.channel_id, [embed], content=rule.mention)
+            else: # The rule was removed from the config since the user was posted
+                self.tracker_notifier.put(int(self.config['channels']['tracker_post']), [embed])
                 
+    @tasks.loop(hours=1.0)
+    async def prune_presence_history(self) -> None:
+        """
+        Delete the presence history older than the retention period.
+        """
+
+        # Left to end the loop, one failure would stop the retention for good
+        try:
+            await self.database.prune_presence_history(self.config["tracker"]["history_days"])
+        except Exception as e:
+            logger.warning(f"Could not prune the presence history: {e}")
+
     @status_task.before_loop
     async def before_status_task(self) -> None:
         """
@@ -289,11 +347,73 @@ class DiscordBot(commands.Bot):
             f"Running on: {platform.system()} {platform.release()} ({os.name})"
         )
         self.logger.info("-------------------")
+        rate_limit = self.config["roblox"]["rate_limit"]
+        circuit_breaker = self.config["roblox"]["circuit_breaker"]
+        self.http_client = HTTPClient(
+            timeout=self.config["roblox"]["timeout"],
+            rate_limiter=ratelimit.RateLimiter(
+                rate=rate_limit["rate"],
+                capacity=rate_limit["burst"],
+                max_retries=rate_limit["max_retries"],
+                max_interactive_wait=rate_limit["max_interactive_wait"]
+            ),
+            failure_threshold=circuit_breaker["failure_threshold"],
+            reset_timeout=circuit_breaker["reset_timeout"]
+        )
         await self.init_db()
+
+        self.tracker = TrackerState(self.database)
+        self.tracker_scheduler = PollScheduler(
+            min_interval=self.config["tracker"]["min_interval"],
+            base_interval=self.config["tracker"]["base_interval"],
+            max_interval=self.config["tracker"]["max_interval"],
+            batch_size=roblox.PRESENCES_BATCH_SIZE,
+            shards=self.config["tracker"]["shards"],
+            max_batches=self.config["tracker"]["max_batches"]
+        )
+        self.database.add_change_listener(self.tracker.apply)
+
+        try:
+            await self.database.start_listening()
+        except Exception as e:
+            self.logger.warning(f"Could not listen for database changes: {e}")
+
+        if self.config["roblox"]["persistent_cache"]:
+            self.lookup_cache = PersistentCache(self.database)
+            self.lookup_cache.start()
+
+        roblox.setup(
+            self.http_client,
+            batch_concurrency=self.config["roblox"]["batch_concurrency"],
+            persistent=self.lookup_cache
+        )
         await self.load_cogs()
         self.status_task.start()
+        self.watch_rules = WatchRules.from_json(self.config["tracker"]["watch_rules"])
+        self.tracker_notifier = TrackerNotifier(self)
+        self.tracker_notifier.start()
+        self.check_tracker.change_interval(seconds=self.config["tracker"]["tick"])
         self.check_tracker.start()
+        self.prune_presence_history.start()
         # self.call_ceo_a_dirty_jew_task.start()
 
+    async def close(self) -> None:
+        """
+        Post the queued tracker embeds, close the shared HTTP client, flush the lookup cache and close the database pool when the bot shuts down.
+        """
+        if self.tracker_notifier:
+            await self.tracker_notifier.close()
+
+        await super().close()
+
+        if self.http_client:
+            await self.http_client.close()
+        if self.lookup_cache:
+            await self.lookup_cache.close()
+        if self.database:
+            await self.database.stop_listening()
+        if self.db_pool:
+            await self.db_pool.close()
+
 bot = DiscordBot()
 bot.run(os.getenv("BOT_TOKEN"))
@@ -0,0 +1,212 @@
+import re
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils.pagination import KeysetPageView
+
+USER_MENTION = re.compile(r"<@!?(\d+)>")
+ROLE_MENTION = re.compile(r"<@&(\d+)>")
+
+def is_officer():
+    """
+    Only let administrators and members with the officer role use a command.
+    """
+
+    async def predicate(interaction: discord.Interaction) -> bool:
+        officer_role = int(interaction.client.config["roles"]["officer_perms"])
+
+        if interaction.user.guild_permissions.administrator or any(role.id == officer_role for role in interaction.user.roles):
+            return True
+
+        raise app_commands.MissingRole(officer_role) # Answered by BotCommandTree.on_error
+
+    return app_commands.check(predicate)
+
+class Leaderboard(KeysetPageView):
+    def __init__(self, bot: commands.Bot, author_id: int, total: int) -> None:
+        super().__init__(author_id, total)
+        self.bot = bot
+
+    async def fetch(self, after: tuple | None, limit: int) -> list[dict]:
+        return await self.bot.database.get_leaderboard(after, limit)
+
+    def cursor(self, row: dict) -> tuple:
+        return row['events'], row['discord_id']
+
+    async def render_page(self, rows: list[dict], position: int, carry: tuple | None) -> tuple[discord.Embed, tuple | None]:
+        description_string = ""
+
+        # Tied members share a rank, like get_leaderboard_rank, so the rank and
+        # events of the row before the page are carried over from the previous page
+        rank, previous_events = carry or (0, None)
+
+        for row_position, row in enumerate(rows, start=position):
+            if row['events'] != previous_events:
+                rank = row_position
+
+            previous_events = row['events']
+            description_string += f"\n`#{rank}` <@{row['discord_id']}>: `{row['events']}` events"
+
+        embed = discord.Embed(
+            title="Leaderboard",
+            description=description_string or "None",
+            color=discord.Color.blue()
+        )
+
+        return embed, (rank, previous_events)
+
+class Events(commands.Cog, name="events"):
+    def __init__(self, bot) -> None:
+        self.bot = bot
+
+    event = app_commands.Group(
+        name="event",
+        description="Manage the events."
+    )
+
+    leaderboard = app_commands.Group(
+        name="leaderboard",
+        description="See who attended the most events."
+    )
+
+    @event.command(
+        name="log",
+        description="Log an event for everyone in a voice channel, mentioned or with a mentioned role"
+    )
+    @app_commands.describe(
+        channel="The voice channel the event was held in",
+        attendees="The members and roles that attended, as mentions"
+    )
+    @app_commands.guild_only()
+    @is_officer()
+    async def log(self, interaction: discord.Interaction, channel: discord.VoiceChannel | None = None, attendees: str | None = None) -> None:
+        """
+        Log an event for every attendee.
+
+        :param interaction: The app command context.
+        :param channel: (Optional) The voice channel the event was held in.
+        :param attendees: (Optional) The members and roles that attended, as mentions.
+        """
+
+        # Resolving hundreds of attendees and writing them can take longer than the 3 seconds to respond
+        await interaction.response.defer(thinking=True)
+
+        members: dict[int, discord.Member] = {} # Deduplicated by ID
+
+        if channel is not None:
+            for member in channel.members:
+                members[member.id] = member
+
+        if attendees:
+            for user_id in USER_MENTION.findall(attendees):
+                member = interaction.guild.get_member(int(user_id))
+
+                if member:
+                    members[member.id] = member
+
+            for role_id in ROLE_MENTION.findall(attendees):
+                role = interaction.guild.get_role(int(role_id))
+
+                if role:
+                    for member in role.members:
+                        members[member.id] = member
+
+        members = {member_id: member for member_id, member in members.items() if not member.bot}
+
+        if not members:
+            embed = discord.Embed(
+                description="No attendees found. Give a voice channel with members in it, or mention members or roles.",
+                color=discord.Color.red(),
+            )
+            await interaction.followup.send(embed=embed)
+            return
+
+        try:
+            totals = await self.bot.database.batch_log_event([str(member_id) for member_id in members])
+        except Exception as e:
+            self.bot.logger.error(f"Could not log an event for {len(members)} attendees\n{type(e).__name__}: {e}")
+
+            embed = discord.Embed(
+                description="An error occurred when logging the event.",
+                color=discord.Color.red(),
+            )
+            await interaction.followup.send(embed=embed)
+            return
+
+        lines = [f"- {member.mention}: `{totals.get(str(member_id), 0)}` events" for member_id, member in sorted(members.items(), key=lambda item: item[1].display_name.lower())]
+
+        # Split the totals over as many embeds as the description limit needs
+        descriptions = [""]
+
+        for line in lines:
+            if len(descriptions[-1]) + len(line) + 1 > 4000:
+                descriptions.append("")
+            descriptions[-1] += f"\n{line}"
+
+        for i, description in enumerate(descriptions):
+            embed = discord.Embed(
+                title=f"Event logged for {len(members)} attendees" if i == 0 else None,
+                description=description,
+                color=discord.Color.green(),
+            )
+            await interaction.followup.send(embed=embed)
+
+    @leaderboard.command(
+        name="top",
+        description="Show the members who attended the most events"
+    )
+    async def top(self, interaction: discord.Interaction) -> None:
+        """
+        Show the events leaderboard, a page at a time.
+
+        :param interaction: The app command context.
+        """
+
+        total = await self.bot.database.count_events_members()
+
+        if total == 0:
+            embed = discord.Embed(
+                description="No events have been logged yet.",
+                color=discord.Color.blue()
+            )
+            await interaction.response.send_message(embed=embed)
+            return
+
+        view = Leaderboard(self.bot, interaction.user.id, total)
+
+        await interaction.response.send_message(embed=await view.render(), view=view)
+
+    @leaderboard.command(
+        name="me",
+        description="Show your place on the events leaderboard"
+    )
+    @app_commands.describe(member="The member to show, yourself by default")
+    async def me(self, interaction: discord.Interaction, member: discord.Member | None = None) -> None:
+        """
+        Show a member's place on the events leaderboard.
+
+        :param interaction: The app command context.
+        :param member: (Optional) The member to show, yourself by default.
+        """
+
+        member = member or interaction.user
+
+        rank = await self.bot.database.get_leaderboard_rank(str(member.id))
+
+        if rank is None:
+            embed = discord.Embed(
+                description=f"{member.mention} hasn't attended any events yet.",
+                color=discord.Color.blue()
+            )
+            await interaction.response.send_message(embed=embed)
+            return
+
+        embed = discord.Embed(
+            description=f"{member.mention} is `#{rank['rank']}` of {rank['total']} with `{rank['events']}` events.",
+            color=discord.Color.blue()
+        )
+        await interaction.response.send_message(embed=embed)
+
+async def setup(bot) -> None:
+    await bot.add_cog(Events(bot))
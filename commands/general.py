@@ -322,8 +322,7 @@ class General(commands.Cog, name="general"):
             raise discord.NotFound()
 
         user_data = await roblox.get_users_by_ids([int(roblox_id)])
-        user_data = user_data['data'][0]
-        user_name = user_data['name']
+        user_name = user_data[int(roblox_id)].name
 
         embed = discord.Embed(
             title="Rank Request - Pending",
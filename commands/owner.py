@@ -192,6 +192,110 @@ class Owner(commands.Cog, name="owner"):
         """
         embed = discord.Embed(description=message, color=discord.Color.blue())
         await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="robloxstats",
+        description="Show the ROBLOX API client stats.",
+    )
+    @commands.is_owner()
+    async def robloxstats(self, context: Context) -> None:
+        """
+        Shows the hit/miss counters of the ROBLOX lookup caches, how many requests were shared, the state of every upstream and the rate limit budgets.
+
+        :param context: The hybrid command context.
+        """
+        embed = discord.Embed(title="ROBLOX Stats", color=discord.Color.blue())
+
+        for name, stats in roblox.cache_stats().items():
+            embed.add_field(
+                name=f"{name.capitalize()} Cache",
+                value=f"Size: `{stats['size']}/{stats['maxsize']}`\nHits: `{stats['hits']}`\nMisses: `{stats['misses']}`\nHit Rate: `{stats['hit_rate']:.0%}`",
+            )
+
+        stats = roblox.coalescing_stats()
+        embed.add_field(
+            name="Coalescing",
+            value=f"In Flight: `{stats['in_flight']}`\nRequests: `{stats['calls']}`\nShared: `{stats['shared']}`",
+        )
+
+        stats = roblox.persistent_cache_stats()
+        if stats:
+            embed.add_field(
+                name="Persistent Cache",
+                value=f"Pending: `{stats['pending']}`\nLoaded: `{stats['loaded']}`\nWritten: `{stats['written']}`",
+            )
+
+        circuits = []
+
+        for host, breaker in roblox.circuit_stats().items():
+            circuit = f"`{host}` {breaker['state']}"
+
+            if breaker['state'] == "open":
+                circuit += f", retry in {breaker['retry_after']:.0f}s"
+            if breaker['short_circuited']:
+                circuit += f", {breaker['short_circuited']} short-circuited"
+
+            circuits.append(circuit)
+
+        embed.add_field(name="Upstreams", value="\n".join(circuits)[:1024] or "None", inline=False)
+
+        budgets = []
+
+        for endpoint, bucket in roblox.rate_limit_stats().items():
+            budget = f"`{endpoint}` {bucket['tokens']:.0f}/{bucket['capacity']:.0f} ({bucket['rate'] * 60:.0f}/min)"
+
+            if bucket['waiting']:
+                budget += f", {bucket['waiting']} waiting"
+            if bucket['blocked_for']:
+                budget += f", blocked {bucket['blocked_for']:.0f}s"
+            if bucket['throttled']:
+                budget += f", {bucket['throttled']} throttled"
+
+            budgets.append(budget)
+
+        embed.add_field(name="Rate Limits", value="\n".join(budgets)[:1024] or "None", inline=False)
+
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="trackerstats",
+        description="Show the tracker polling stats.",
+    )
+    @commands.is_owner()
+    async def trackerstats(self, context: Context) -> None:
+        """
+        Shows how the tracked users are scheduled and how long polling takes compared to its interval.
+
+        :param context: The hybrid command context.
+        """
+        stats = self.bot.tracker_scheduler.stats()
+        interval = self.bot.check_tracker.seconds
+
+        embed = discord.Embed(
+            title="Tracker Stats",
+            color=discord.Color.blue() if not stats['overruns'] else discord.Color.orange()
+        )
+
+        embed.add_field(
+            name="Schedule",
+            value=f"Tracked: `{stats['scheduled']}`\nDue: `{stats['due']}`\nActive: `{stats['active']}`\nPolls: `{stats['polls']}`",
+        )
+        embed.add_field(
+            name="Cycles",
+            value=f"Interval: `{interval:.1f}s`\nLast: `{stats['last_cycle']:.2f}s`\nAverage: `{stats['average_cycle']:.2f}s`\nMax: `{stats['max_cycle']:.2f}s`\nOverruns: `{stats['overruns']}/{stats['cycles']}`",
+        )
+        embed.add_field(
+            name="Shards",
+            value=" ".join(f"`{count}`" for count in stats['shards']),
+        )
+
+        stats = self.bot.tracker_notifier.stats()
+        embed.add_field(
+            name="Notifications",
+            value=f"Queued: `{stats['queued']}`\nMessages: `{stats['messages']}`\nEmbeds: `{stats['embeds']}`\nDropped: `{stats['dropped']}`\nFailed: `{stats['failed']}`",
+        )
+
+        await context.send(embed=embed)
     
 async def setup(bot) -> None:
     await bot.add_cog(Owner(bot))
\ No newline at end of file
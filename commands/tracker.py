@@ -3,7 +3,44 @@ import math
 from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
-from utils import roblox
+from utils import _discord, roblox
+from utils.pagination import KeysetPageView
+
+class TrackerList(_discord.UpstreamUnavailableMixin, KeysetPageView):
+    def __init__(self, bot: commands.Bot, author_id: int, total: int) -> None:
+        super().__init__(author_id, total)
+        self.bot = bot
+
+    async def fetch(self, after: tuple | None, limit: int) -> list[dict]:
+        return await self.bot.database.get_tracked_users_page(after, limit)
+
+    def cursor(self, row: dict) -> tuple:
+        return row['created_at'], row['roblox_id']
+
+    def footer(self) -> str:
+        return f"{super().footer()} | {self.total} tracked"
+
+    async def render_page(self, rows: list[dict], position: int, carry: None) -> tuple[discord.Embed, None]:
+        # Only the names on this page are resolved
+        users = await roblox.get_users_by_ids([int(row['roblox_id']) for row in rows])
+        description_string = ""
+
+        for row in rows:
+            user = users.get(int(row['roblox_id']))
+            reason = row['reason'] if len(row['reason']) <= 100 else row['reason'][:99] + "…"
+            unix_timestamp = math.floor(row['created_at'].timestamp())
+
+            if user:
+                description_string += f"\n- [{user.name}]({user.profile}) | `{reason}` (<t:{unix_timestamp}:d>)"
+            else:
+                description_string += f"\n- {row['roblox_id']} | `{reason}` (<t:{unix_timestamp}:d>)"
+
+        embed = discord.Embed(
+            description=description_string or "None",
+            color=discord.Color.blue()
+        )
+
+        return embed, None
 
 class Tracker(commands.Cog, name="tracker"):
     def __init__(self, bot) -> None:
@@ -41,8 +78,8 @@ class Tracker(commands.Cog, name="tracker"):
             await interaction.response.send_message(embed=embed)      
             return
         
-        user_id = str(roblox_user["id"])
-        user_name = roblox_user["username"]
+        user_id = str(roblox_user.id)
+        user_name = roblox_user.name
         
         success = await self.bot.database.get_tracked_user(user_id)
 
@@ -58,6 +95,8 @@ class Tracker(commands.Cog, name="tracker"):
         success = await self.bot.database.track_user(user_id, moderator_id, reason if reason else "No reason stated.")
 
         if success:
+            self.bot.tracker.invalidate()
+
             embed = discord.Embed(
                 description=f"Now tracking [{user_name}]({await roblox.profile(user_id)}).",
                 color=discord.Color.green(),
@@ -94,8 +133,8 @@ class Tracker(commands.Cog, name="tracker"):
             await interaction.response.send_message(embed=embed)      
             return
         
-        user_id = str(roblox_user["id"])
-        user_name = roblox_user["username"]
+        user_id = str(roblox_user.id)
+        user_name = roblox_user.name
         
         success = await self.bot.database.get_tracked_user(user_id)
 
@@ -111,6 +150,8 @@ class Tracker(commands.Cog, name="tracker"):
         success = await self.bot.database.untrack_user(user_id)
 
         if success:
+            self.bot.tracker.invalidate()
+
             embed = discord.Embed(
                 description=f"Stopped tracking [{user_name}]({await roblox.profile(user_id)}).",
                 color=discord.Color.green(),
@@ -135,42 +176,90 @@ class Tracker(commands.Cog, name="tracker"):
         :param interaction: The app command context.
         """
 
-        tracked_users = await self.bot.database.get_tracked_users()
+        # Resolving the names of a page on ROBLOX can take longer than the 3 seconds to respond
+        await interaction.response.defer()
+
+        total = await self.bot.database.count_tracked_users()
 
-        if len(tracked_users) == 0:
+        if total == 0:
             embed = discord.Embed(
                 description="None",
                 color=discord.Color.blue()
             )
 
-            await interaction.response.send_message(embed=embed)
+            await interaction.followup.send(embed=embed)
             return
 
-        user_ids = []
+        view = TrackerList(self.bot, interaction.user.id, total)
 
-        for x in tracked_users:
-            user_ids.append(int(x['roblox_id']))
+        await interaction.followup.send(embed=await view.render(), view=view)
 
-        users = await roblox.get_users_by_ids(user_ids) # Only can request 50 at one time
-        users = users['data']
-        description_string = ""
+    @tracker.command(
+        name="history",
+        description="Show when a tracked user is usually online"
+    )
+    @app_commands.describe(user="The user to show", days="The number of days to look back")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def history(self, interaction: discord.Interaction, user: str, days: app_commands.Range[int, 1, 90] = 7) -> None:
+        """
+        Show the game sessions of a tracked user and the hours they are usually online.
 
-        for user in users:
-            user_obj = list(filter(lambda u: str(user['id']) == u['roblox_id'], tracked_users))
-            user_obj = user_obj[0]
+        :param interaction: The app command context.
+        :param user: The user to show.
+        :param days: The number of days to look back.
+        """
+
+        roblox_user = await roblox.get_user(user)
+
+        if roblox_user is None:
+            embed = discord.Embed(
+                description=f"User \"{user}\" not found.",
+                color=discord.Color.red(),
+            )      
+            await interaction.response.send_message(embed=embed)      
+            return
 
-            unix_timestamp = math.floor(user_obj['created_at'].timestamp())
-            description_string += f"\n- [{user['name']}]({await roblox.profile(user['id'])}) | `{user_obj['reason']}` (<t:{unix_timestamp}:d>)"
+        sessions = await self.bot.database.get_presence_sessions(roblox_user.id, days)
+        hours = await self.bot.database.get_presence_hours(roblox_user.id, days)
+
+        if not sessions and not hours:
+            embed = discord.Embed(
+                description=f"No presence history for [{roblox_user.name}]({roblox_user.profile}) in the last {days} days.",
+                color=discord.Color.blue(),
+            )
+            await interaction.response.send_message(embed=embed)
+            return
 
         embed = discord.Embed(
-            description=description_string,
+            title=f"{roblox_user.name}'s last {days} days",
+            url=roblox_user.profile,
             color=discord.Color.blue()
         )
 
+        games = ""
+
+        for session in sessions[:10]:
+            place = "Joins off" if session['root_place_id'] is None else f"[{session['root_place_id']}](https://www.roblox.com/games/{session['root_place_id']})"
+            games += f"\n- {place}: {self._duration(session['total'])} in {session['sessions']} sessions (longest {self._duration(session['longest'])})"
+
+        embed.add_field(name="Games", value=games or "None", inline=False)
+
+        # One bar per hour of the day, scaled to the busiest hour
+        online = {row['hour']: row['online'] for row in hours}
+        busiest = max(online.values(), default=0)
+        bars = " ▁▂▃▄▅▆▇█"
+        histogram = "".join(bars[math.ceil(online.get(hour, 0) / busiest * (len(bars) - 1))] if busiest else bars[0] for hour in range(24))
+
+        embed.add_field(name="Online by Hour (UTC)", value=f"```\n{histogram}\n0     6     12    18   \n```", inline=False)
+
         await interaction.response.send_message(embed=embed)
 
+    @staticmethod
+    def _duration(seconds: int) -> str:
+        hours, minutes = divmod(seconds // 60, 60)
+
+        return f"{hours}h {minutes}m" if hours else f"{minutes}m"
 
 
 async def setup(bot) -> None:
-    pass
-    # await bot.add_cog(Tracker(bot))
\ No newline at end of file
+    await bot.add_cog(Tracker(bot))
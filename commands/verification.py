@@ -6,18 +6,21 @@ from discord.ext import commands
 from utils import _discord, roblox
 
 class AccountSelection(discord.ui.Select):
-    def __init__(self, bot: commands.Bot, purpose: str, accounts: list, users: list):
+    def __init__(self, bot: commands.Bot, purpose: str, accounts: list, users: dict):
         self.bot = bot
         self.purpose = purpose
 
         options = []
 
-        if not users["data"]:
+        if not users:
             return
         
         # Set the options that will be presented inside the dropdown
-        for i, user in enumerate(users["data"]):
-            options.append(discord.SelectOption(label=f"{user['name']} ({user['id']})", description=f"Verified on {accounts[i]['verified_at'].strftime("%m-%d-%Y")}"))
+        for account in accounts:
+            user = users.get(int(account["roblox_id"]))
+
+            if user:
+                options.append(discord.SelectOption(label=f"{user.name} ({user.id})", description=f"Verified on {account['verified_at'].strftime("%m-%d-%Y")}"))
 
         # The placeholder is what will be shown when no option is chosen
         # The min and max values indicate we can only pick one of the options
@@ -75,8 +78,8 @@ class AccountSelection(discord.ui.Select):
 
             await interaction.followup.send(embed=embed, ephemeral=True)
 
-class DropdownView(discord.ui.View):
-    def __init__(self, bot: commands.Bot, purpose: str, accounts: list, users: list):
+class DropdownView(_discord.UpstreamUnavailableMixin, discord.ui.View):
+    def __init__(self, bot: commands.Bot, purpose: str, accounts: list, users: dict):
         super().__init__()
         # Adds the dropdown to our view object.
         self.add_item(AccountSelection(
@@ -86,7 +89,7 @@ class DropdownView(discord.ui.View):
             users=users
         ))
 
-class Confirm(discord.ui.View):
+class Confirm(_discord.UpstreamUnavailableMixin, discord.ui.View):
     def __init__(self, bot: commands.Bot) -> None:
         super().__init__()
         self.bot = bot
@@ -100,9 +103,9 @@ class Confirm(discord.ui.View):
         user_id = active_code[1]
         code = active_code[2]
 
-        user_information = await roblox.get_user_information(str(user_id))
+        user_information = await roblox.get_user_information(str(user_id), fresh=True)
 
-        user_description = user_information['description']
+        user_description = (user_information.description if user_information else None) or ""
 
         if code in user_description:
             verification = await self.bot.database.create_verification(str(interaction.user.id), str(user_id))
@@ -138,7 +141,7 @@ class Confirm(discord.ui.View):
         await self.bot.database.delete_verification_code(str(interaction.user.id))
         await interaction.message.delete()
 
-class VerificationModal(discord.ui.Modal, title='Verification'):
+class VerificationModal(_discord.UpstreamUnavailableMixin, discord.ui.Modal, title='Verification'):
     def __init__(self, bot):
         super().__init__()
 
@@ -159,8 +162,8 @@ class VerificationModal(discord.ui.Modal, title='Verification'):
             await interaction.response.send_message(embed=embed)      
             return
         
-        user_id = roblox_user["id"]
-        user_name = roblox_user["username"]
+        user_id = roblox_user.id
+        user_name = roblox_user.name
 
         code = await self.bot.database.create_verification_code(str(interaction.user.id), str(user_id))
 
@@ -305,7 +308,7 @@ class Verification(commands.Cog, name="verification"):
 
             user_information = await roblox.get_users_by_ids([int(user_id)])
 
-            user_name = user_information['data'][0]['name']
+            user_name = user_information[int(user_id)].name
 
             try:
                 embed = discord.Embed(
@@ -331,17 +334,17 @@ class Verification(commands.Cog, name="verification"):
                     if verification:
                         user_id = None
                         await interaction.response.send_modal(VerificationModal(self.bot))
+                        return
 
-                    user_name = await roblox.get_users_by_ids([user_id])
+                    user = (await roblox.get_users_by_ids([user_id])).get(user_id)
 
-                    if not user_name:
+                    if not user:
                         user_id = None
                         await interaction.response.send_modal(VerificationModal(self.bot))
-                    
-                    user_name = user_name['data'][0]
+                        return
 
                     embed = discord.Embed(
-                        description=f"Bloxlink bind found. Would you like to verify as: [{user_name['name']}]({await roblox.profile(str(user_id))})",
+                        description=f"Bloxlink bind found. Would you like to verify as: [{user.name}]({user.profile})",
                         color=discord.Color.blue()
                     )
 
@@ -460,8 +463,8 @@ class Verification(commands.Cog, name="verification"):
             await interaction.response.send_message(embed=embed)
             return
         
-        user_name = user_object["username"]
-        user_id = user_object["id"]
+        user_name = user_object.name
+        user_id = user_object.id
         
         await self.bot.database.create_verification(str(discord_user.id), str(user_id))
 
@@ -513,8 +516,11 @@ class Verification(commands.Cog, name="verification"):
 
             users = await roblox.get_users_by_ids(user_ids)
 
-            for i, u in enumerate(users["data"]):
-                embed.description += f"- [{u['name']}](https://www.roblox.com/users/{u['id']}/profile) ({u['id']}) - <t:{math.floor(accounts[i]['verified_at'].timestamp())}:R>\n"
+            for account in accounts:
+                u = users.get(int(account["roblox_id"]))
+
+                if u:
+                    embed.description += f"- [{u.name}]({u.profile}) ({u.id}) - <t:{math.floor(account['verified_at'].timestamp())}:R>\n"
 
             await interaction.response.send_message(embed=embed)
             return
@@ -529,8 +535,8 @@ class Verification(commands.Cog, name="verification"):
                 await interaction.response.send_message(embed=embed)
                 return
             
-            user_name = user_object["username"]
-            user_id = user_object["id"]
+            user_name = user_object.name
+            user_id = user_object.id
 
             links = await self.bot.database.get_verification_by_roblox_id(str(user_id))
 
@@ -577,8 +583,8 @@ class Verification(commands.Cog, name="verification"):
             await interaction.response.send_message(embed=embed)
             return
         
-        user_name = user_object["username"]
-        user_id = user_object["id"]
+        user_name = user_object.name
+        user_id = user_object.id
         
         await self.bot.database.delete_verification(str(discord_user.id), str(user_id))
 
@@ -588,6 +594,31 @@ class Verification(commands.Cog, name="verification"):
         )
 
         await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(
+        name="syncroles",
+        description="Update the roles of every verified guild member.",
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def syncroles(self, interaction: Interaction) -> None:
+        await interaction.response.defer(thinking=True)
+
+        data = await _discord.sync_guild_roles(self.bot, interaction.guild)
+
+        embed = discord.Embed(
+            title="Role Sync",
+            color=discord.Color.green() if not data["failed"] else discord.Color.orange(),
+        )
+
+        embed.add_field(name="Verified Members", value=data["members"], inline=True)
+        embed.add_field(name="Updated", value=data["updated"], inline=True)
+        embed.add_field(name="Failed", value=data["failed"], inline=True)
+        embed.add_field(name="Roles Added", value=data["roles_added"], inline=True)
+        embed.add_field(name="Roles Removed", value=data["roles_removed"], inline=True)
+        embed.add_field(name="Unknown Rank", value=data["skipped"], inline=True)
+
+        await interaction.followup.send(embed=embed)
     
 async def setup(bot) -> None:
     await bot.add_cog(Verification(bot))
\ No newline at end of file
@@ -1,10 +1,116 @@
+import asyncio
 import asyncpg
 import random
 import datetime
+import json
+
+from typing import Callable
+
+from utils.cache import MISSING, TTLCache
+
+CHANGES_CHANNEL = "bot_changes" # The NOTIFY channel of the schema's triggers
 
 class DatabaseManager:
     def __init__(self, *, connection: asyncpg.pool.Pool) -> None:
         self.connection = connection
+        self.verification_cache = TTLCache(maxsize=10_000, ttl=600.0) # Only used while listening for changes
+        self._verification_generation = 0 # Bumped by every invalidation, so a read racing one isn't cached
+        self.leaderboard_cache = TTLCache(maxsize=50, ttl=60.0) # Leaderboard pages, cleared when events are logged
+        self._change_listeners: list[Callable[[dict], None]] = []
+        self._listener: asyncpg.Connection | None = None
+        self._relisten: asyncio.Task | None = None
+
+#   ==============================
+#   ======= NOTIFICATIONS ========
+#   ==============================
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None and not self._listener.is_closed()
+
+    def add_change_listener(self, listener: Callable[[dict], None]) -> None:
+        """
+        Call a function with every change notified by the database.
+
+        :param listener: Called with the change, ex. {"table": "tracked_users", "op": "DELETE", "old": {...}, "new": None}.
+        A change of {"op": "RESET"} means changes may have been missed.
+        """
+
+        self._change_listeners.append(listener)
+
+    async def start_listening(self) -> None:
+        """
+        Hold one pool connection to LISTEN for the changes notified by the schema's triggers.
+        """
+
+        if self.listening:
+            return
+
+        conn = await self.connection.acquire()
+
+        try:
+            await conn.add_listener(CHANGES_CHANNEL, self._on_notification)
+        except Exception:
+            await self.connection.release(conn)
+            raise
+
+        conn.add_termination_listener(self._on_listener_terminated)
+        self._listener = conn
+
+        self._dispatch_change({"op": "RESET"}) # Anything could have changed while not listening
+
+    async def stop_listening(self) -> None:
+        if self._relisten is not None:
+            self._relisten.cancel()
+            self._relisten = None
+
+        conn, self._listener = self._listener, None
+
+        if conn is None:
+            return
+
+        conn.remove_termination_listener(self._on_listener_terminated)
+
+        if not conn.is_closed():
+            await conn.remove_listener(CHANGES_CHANNEL, self._on_notification)
+
+        await self.connection.release(conn)
+
+    def _on_notification(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        self._dispatch_change(json.loads(payload))
+
+    def _on_listener_terminated(self, conn: asyncpg.Connection) -> None:
+        if conn is not self._listener:
+            return
+
+        self._listener = None
+        self._dispatch_change({"op": "RESET"})
+
+        asyncio.ensure_future(self.connection.release(conn))
+
+        if self._relisten is None or self._relisten.done():
+            self._relisten = asyncio.ensure_future(self._listen_again())
+
+    async def _listen_again(self) -> None:
+        while not self.listening:
+            await asyncio.sleep(5)
+
+            try:
+                await self.start_listening()
+            except Exception:
+                pass # Try again later
+
+    def _dispatch_change(self, change: dict) -> None:
+        if change["op"] == "RESET":
+            self._verification_generation += 1
+            self.verification_cache.clear()
+        elif change["table"] == "verifications":
+            for row in (change.get("old"), change.get("new")):
+                if row:
+                    self._invalidate_verification(row["discord_id"], row["roblox_id"])
+
+        for listener in self._change_listeners:
+            listener(change)
 
 #   ==============================
 #   ========== WARNINGS ==========
@@ -14,32 +120,25 @@ class DatabaseManager:
         self, discord_id: str, server_id: str, moderator_id: str, reason: str
     ) -> int:
         async with self.connection.acquire() as conn:
-            result = await conn.fetchrow(
-                "SELECT id FROM warns WHERE discord_id=$1 AND server_id=$2 ORDER BY id DESC LIMIT 1",
-                discord_id,
-                server_id,
-            )
-            warn_id = result['id'] + 1 if result is not None else 1
-            await conn.execute(
-                "INSERT INTO warns(id, discord_id, server_id, moderator_id, reason) VALUES ($1, $2, $3, $4, $5)",
-                warn_id,
+            return await conn.fetchval(
+                "INSERT INTO warns(discord_id, server_id, moderator_id, reason) VALUES ($1, $2, $3, $4) RETURNING id",
                 discord_id,
                 server_id,
                 moderator_id,
                 reason,
             )
-            return warn_id
 
     async def remove_warn(self, warn_id: int, discord_id: str, server_id: str) -> int:
         async with self.connection.acquire() as conn:
-            await conn.execute(
-                "DELETE FROM warns WHERE id=$1 AND discord_id=$2 AND server_id=$3",
-                warn_id,
-                discord_id,
-                server_id,
-            )
+            # The count reads the table as it was before the delete, so the deleted row is subtracted
             result = await conn.fetchval(
-                "SELECT COUNT(*) FROM warns WHERE discord_id=$1 AND server_id=$2",
+                """
+                WITH deleted AS (
+                    DELETE FROM warns WHERE id=$1 AND discord_id=$2 AND server_id=$3 RETURNING id
+                )
+                SELECT COUNT(*) - (SELECT COUNT(*) FROM deleted) FROM warns WHERE discord_id=$2 AND server_id=$3
+                """,
+                warn_id,
                 discord_id,
                 server_id,
             )
@@ -96,39 +195,58 @@ class DatabaseManager:
             )
             return result
 
-    async def create_verification(self, discord_id: str, roblox_id: str) -> bool:
+    async def create_verification(self, discord_id: str, roblox_id: str) -> int:
         async with self.connection.acquire() as conn:
-            result = await conn.fetchrow(
-                "SELECT id FROM verifications ORDER BY id DESC LIMIT 1"
-            )
-            verification_id = result['id'] + 1 if result is not None else 1
-
-            result = await conn.execute(
-                "INSERT INTO verifications(id, discord_id, roblox_id, verified_at) VALUES ($1, $2, $3, $4)",
-                verification_id,
+            # Verifying an already linked account again refreshes it
+            verification_id = await conn.fetchval(
+                """
+                INSERT INTO verifications(discord_id, roblox_id, verified_at) VALUES ($1, $2, $3)
+                ON CONFLICT (discord_id, roblox_id) DO UPDATE SET verified_at=EXCLUDED.verified_at
+                RETURNING id
+                """,
                 discord_id,
                 roblox_id,
                 datetime.datetime.now()
             )
 
-            if result: return True
-            return False
+        self._invalidate_verification(discord_id, roblox_id)
+
+        return verification_id
 
     async def get_verification_by_discord_id(self, discord_id: str) -> list:
-        async with self.connection.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT discord_id, roblox_id, verified_at FROM verifications WHERE discord_id=$1",
-                discord_id,
-            )
-            return [dict(row) for row in rows]
+        return await self._get_verifications("discord_id", discord_id)
 
     async def get_verification_by_roblox_id(self, roblox_id: str) -> list:
+        return await self._get_verifications("roblox_id", roblox_id)
+
+    async def _get_verifications(self, column: str, value: str) -> list:
+        listening = self.listening # Without notifications, a cached entry could be stale
+
+        if listening:
+            rows = self.verification_cache.get((column, str(value)))
+
+            if rows is not MISSING:
+                return [dict(row) for row in rows]
+
+        generation = self._verification_generation
+
         async with self.connection.acquire() as conn:
             rows = await conn.fetch(
-                "SELECT discord_id, roblox_id, verified_at FROM verifications WHERE roblox_id=$1",
-                roblox_id,
+                f"SELECT discord_id, roblox_id, verified_at FROM verifications WHERE {column}=$1",
+                value,
             )
-            return [dict(row) for row in rows]
+            rows = [dict(row) for row in rows]
+
+        # An invalidation while reading may have come after the rows were read, so they could already be stale
+        if listening and generation == self._verification_generation:
+            self.verification_cache.set((column, str(value)), rows)
+
+        return [dict(row) for row in rows]
+
+    def _invalidate_verification(self, discord_id: str, roblox_id: str) -> None:
+        self._verification_generation += 1
+        self.verification_cache.invalidate(("discord_id", str(discord_id)))
+        self.verification_cache.invalidate(("roblox_id", str(roblox_id)))
 
     async def get_all_verifications(self) -> list:
         async with self.connection.acquire() as conn:
@@ -145,6 +263,8 @@ class DatabaseManager:
                 roblox_id
             )
 
+        self._invalidate_verification(discord_id, roblox_id)
+
 #   ==============================
 #   ========== TRACKER ===========
 #   ==============================
@@ -152,7 +272,7 @@ class DatabaseManager:
     async def get_tracked_user(self, roblox_id: str) -> asyncpg.Record:
         async with self.connection.acquire() as conn:
             result = await conn.fetchrow(
-                "SELECT roblox_id, posted, moderator_id, reason, created_at FROM tracked_users WHERE roblox_id=$1",
+                "SELECT roblox_id, posted, posted_rule, moderator_id, reason, created_at FROM tracked_users WHERE roblox_id=$1",
                 roblox_id,
             )
             return result
@@ -164,6 +284,32 @@ class DatabaseManager:
             )
             return [dict(row) for row in rows]
 
+    async def get_tracked_users_page(self, after: tuple[datetime.datetime, str] | None, limit: int) -> list:
+        """
+        Get tracked users in the order they were added, starting after a (created_at, roblox_id) cursor.
+        """
+
+        async with self.connection.acquire() as conn:
+            if after is None:
+                rows = await conn.fetch(
+                    "SELECT roblox_id, moderator_id, reason, created_at FROM tracked_users ORDER BY created_at, roblox_id LIMIT $1",
+                    limit,
+                )
+            else:
+                rows = await conn.fetch(
+                    "SELECT roblox_id, moderator_id, reason, created_at FROM tracked_users WHERE (created_at, roblox_id) > ($1, $2) ORDER BY created_at, roblox_id LIMIT $3",
+                    after[0],
+                    after[1],
+                    limit,
+                )
+            return [dict(row) for row in rows]
+
+    async def count_tracked_users(self) -> int:
+        async with self.connection.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT COUNT(*) FROM tracked_users",
+            )
+
     async def track_user(self, roblox_id: str, moderator_id: str, reason: str) -> bool:
         async with self.connection.acquire() as conn:
             result = await conn.execute(
@@ -198,40 +344,174 @@ class DatabaseManager:
 
             if result: return True
             return False
+
+    async def set_tracked_users_posted(self, changes: list[tuple[str, str | None]]) -> None:
+        roblox_ids, rules = zip(*changes)
+
+        async with self.connection.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE tracked_users SET posted=change.posted_rule IS NOT NULL, posted_rule=change.posted_rule
+                FROM unnest($1::text[], $2::text[]) AS change(roblox_id, posted_rule)
+                WHERE tracked_users.roblox_id=change.roblox_id
+                """,
+                list(roblox_ids),
+                list(rules),
+            )
         
+    async def add_presence_history(self, transitions: list[tuple[int, int, int | None, float]]) -> None:
+        roblox_ids, presences, root_place_ids, seen_at = zip(*transitions)
+
+        async with self.connection.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO presence_history(roblox_id, presence, root_place_id, seen_at)
+                SELECT roblox_id, presence, root_place_id, to_timestamp(seen_at)
+                FROM unnest($1::bigint[], $2::smallint[], $3::bigint[], $4::float8[]) AS transition(roblox_id, presence, root_place_id, seen_at)
+                """,
+                list(roblox_ids),
+                list(presences),
+                list(root_place_ids),
+                list(seen_at),
+            )
+
+    async def prune_presence_history(self, days: int) -> None:
+        async with self.connection.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM presence_history WHERE seen_at < CURRENT_TIMESTAMP - make_interval(days => $1)",
+                days,
+            )
+
+    async def get_presence_sessions(self, roblox_id: int, days: int) -> list:
+        """
+        Get how long a user was in every game, from their presence history.
+
+        Consecutive transitions to the same presence are merged into one session,
+        which lasts until the next transition.
+        """
+
+        async with self.connection.acquire() as conn:
+            rows = await conn.fetch(
+                f"""
+                WITH {self._PRESENCE_SESSIONS}
+                SELECT root_place_id, COUNT(*) AS sessions,
+                       EXTRACT(epoch FROM SUM(ended_at - started_at))::int AS total,
+                       EXTRACT(epoch FROM AVG(ended_at - started_at))::int AS average,
+                       EXTRACT(epoch FROM MAX(ended_at - started_at))::int AS longest
+                FROM sessions
+                WHERE presence=2
+                GROUP BY root_place_id
+                ORDER BY total DESC
+                """,
+                roblox_id,
+                days,
+            )
+            return [dict(row) for row in rows]
+
+    async def get_presence_hours(self, roblox_id: int, days: int) -> list:
+        """
+        Get in how many hours of the day (UTC) a user was online, from their presence history.
+        """
+
+        async with self.connection.acquire() as conn:
+            rows = await conn.fetch(
+                f"""
+                WITH {self._PRESENCE_SESSIONS}
+                SELECT EXTRACT(hour FROM online_at AT TIME ZONE 'UTC')::int AS hour, COUNT(*) AS online
+                FROM sessions, generate_series(date_trunc('hour', started_at), ended_at, interval '1 hour') AS online_at
+                WHERE presence<>0
+                GROUP BY 1
+                ORDER BY 1
+                """,
+                roblox_id,
+                days,
+            )
+            return [dict(row) for row in rows]
+
+    # Merges the presence history of user $1 over the last $2 days into sessions
+    _PRESENCE_SESSIONS = """
+        transitions AS (
+            SELECT seen_at, presence, root_place_id,
+                   COALESCE(LEAD(seen_at) OVER w, CURRENT_TIMESTAMP) AS ended_at,
+                   presence IS DISTINCT FROM LAG(presence) OVER w OR root_place_id IS DISTINCT FROM LAG(root_place_id) OVER w AS starts
+            FROM presence_history
+            WHERE roblox_id=$1 AND seen_at >= CURRENT_TIMESTAMP - make_interval(days => $2)
+            WINDOW w AS (ORDER BY seen_at)
+        ),
+        islands AS (
+            SELECT *, SUM(starts::int) OVER (ORDER BY seen_at) AS island FROM transitions
+        ),
+        sessions AS (
+            SELECT presence, root_place_id, MIN(seen_at) AS started_at, MAX(ended_at) AS ended_at
+            FROM islands
+            GROUP BY island, presence, root_place_id
+        )
+    """
+
+#   ==============================
+#   ======== LOOKUP CACHE ========
+#   ==============================
+
+    async def get_cached_lookups(self, kind: str, keys: list[str]) -> dict:
+        async with self.connection.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT key, value, EXTRACT(epoch FROM expires_at - CURRENT_TIMESTAMP)::float8 AS ttl FROM roblox_cache WHERE kind=$1 AND key=ANY($2::text[]) AND expires_at > CURRENT_TIMESTAMP",
+                kind,
+                keys,
+            )
+            return {row['key']: (json.loads(row['value']), row['ttl']) for row in rows}
+
+    async def set_cached_lookups(self, entries: list[tuple[str, str, object, float]]) -> None:
+        kinds, keys, values, expires_at = zip(*entries)
+
+        async with self.connection.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO roblox_cache(kind, key, value, expires_at)
+                SELECT kind, key, value::jsonb, to_timestamp(expires_at)
+                FROM unnest($1::text[], $2::text[], $3::text[], $4::float8[]) AS entry(kind, key, value, expires_at)
+                ON CONFLICT (kind, key) DO UPDATE SET value=EXCLUDED.value, expires_at=EXCLUDED.expires_at
+                """,
+                list(kinds),
+                list(keys),
+                [json.dumps(value) for value in values],
+                list(expires_at),
+            )
+
+    async def prune_cached_lookups(self) -> None:
+        async with self.connection.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM roblox_cache WHERE expires_at <= CURRENT_TIMESTAMP",
+            )
+
 #   ==============================
 #   =========== EVENTS ===========
 #   ==============================
 
-    async def batch_log_event(self, members: list[str]) -> bool:
-        date = datetime.datetime.now()
+    async def batch_log_event(self, members: list[str]) -> dict[str, int]:
+        """
+        Count one more attended event for every member, in one statement.
+
+        :return: The new event count of every member.
+        """
+
+        if not members:
+            return {}
+
         async with self.connection.acquire() as conn:
-            try:
-                for member in members:
-                    result = await conn.fetchrow(
-                    "SELECT events FROM events WHERE discord_id=$1",
-                    member
-                    )
-                    if result is not None:
-                        events = result['events'] + 1
-
-                        await conn.execute(
-                            "UPDATE events SET events=$1 WHERE discord_id=$2",
-                            events,
-                            member
-                        )
-                    else:
-                        await conn.execute(
-                            "INSERT INTO events(discord_id, events, created_at) VALUES ($1, $2, $3)",
-                            member,
-                            1,
-                            date
-                        )
-            except Exception as e:
-                print(e)
-                return False
-            
-            return True
+            rows = await conn.fetch(
+                """
+                INSERT INTO events(discord_id, events, created_at)
+                SELECT DISTINCT discord_id, 1, CURRENT_TIMESTAMP FROM unnest($1::text[]) AS member(discord_id)
+                ON CONFLICT (discord_id) DO UPDATE SET events=events.events + 1
+                RETURNING discord_id, events
+                """,
+                members
+            )
+
+            self.leaderboard_cache.clear()
+
+            return {row['discord_id']: row['events'] for row in rows}
         
     async def get_events(self, discord_id: str) -> asyncpg.Record:
         async with self.connection.acquire() as conn:
@@ -241,9 +521,54 @@ class DatabaseManager:
             )
             return result
         
-    async def get_leaderboard(self) -> list[asyncpg.Record]:
+    async def get_leaderboard(self, after: tuple[int, str] | None = None, limit: int = 10) -> list:
+        """
+        Get members by events attended, starting after an (events, discord_id) cursor.
+        """
+
+        rows = self.leaderboard_cache.get((after, limit))
+
+        if rows is not MISSING:
+            return [dict(row) for row in rows]
+
         async with self.connection.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM events ORDER BY events DESC",
+            if after is None:
+                rows = await conn.fetch(
+                    "SELECT discord_id, events FROM events ORDER BY events DESC, discord_id LIMIT $1",
+                    limit,
+                )
+            else:
+                rows = await conn.fetch(
+                    "SELECT discord_id, events FROM events WHERE events <= $1 AND (events < $1 OR discord_id > $2) ORDER BY events DESC, discord_id LIMIT $3",
+                    after[0],
+                    after[1],
+                    limit,
+                )
+            rows = [dict(row) for row in rows]
+
+        self.leaderboard_cache.set((after, limit), rows)
+
+        return [dict(row) for row in rows]
+
+    async def get_leaderboard_rank(self, discord_id: str) -> asyncpg.Record:
+        """
+        Get a member's events, rank (ties share one) and the number of ranked members.
+        """
+
+        async with self.connection.acquire() as conn:
+            return await conn.fetchrow(
+                """
+                SELECT member.events,
+                       (SELECT COUNT(*) FROM events WHERE events > member.events) + 1 AS rank,
+                       (SELECT COUNT(*) FROM events) AS total
+                FROM events member
+                WHERE member.discord_id=$1
+                """,
+                discord_id,
             )
-            return [dict(row) for row in rows]
\ No newline at end of file
+
+    async def count_events_members(self) -> int:
+        async with self.connection.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT COUNT(*) FROM events",
+            )
\ No newline at end of file
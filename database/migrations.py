@@ -0,0 +1,66 @@
+import os
+import re
+
+import asyncpg
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), "migrations")
+
+def get_migrations() -> list[tuple[int, str, str]]:
+    """
+    Read the migrations, named like 0001_initial.sql.
+
+    :return: The version, name and SQL of every migration, in order.
+    """
+
+    migrations = []
+
+    for file in sorted(os.listdir(MIGRATIONS_PATH)):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", file)
+
+        if not match:
+            continue
+
+        with open(os.path.join(MIGRATIONS_PATH, file), "r") as f:
+            migrations.append((int(match[1]), match[2], f.read()))
+
+    return migrations
+
+async def migrate(pool: asyncpg.pool.Pool) -> list[str]:
+    """
+    Apply the migrations that weren't applied yet, each in its own transaction.
+
+    :param pool: The database pool.
+    :return: The names of the applied migrations.
+    """
+
+    applied = []
+
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version INT PRIMARY KEY,
+              name VARCHAR(100) NOT NULL,
+              applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        for version, name, sql in get_migrations():
+            async with conn.transaction():
+                # Another instance starting at the same time waits here
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+
+                if await conn.fetchval("SELECT 1 FROM schema_migrations WHERE version=$1", version):
+                    continue
+
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations(version, name) VALUES ($1, $2)",
+                    version,
+                    name,
+                )
+
+            applied.append(f"{version:04d}_{name}")
+
+    return applied
@@ -0,0 +1,81 @@
+CREATE TABLE IF NOT EXISTS warns (
+  id SERIAL PRIMARY KEY,
+  discord_id VARCHAR(30) NOT NULL,
+  server_id VARCHAR(30) NOT NULL,
+  moderator_id VARCHAR(30) NOT NULL,
+  reason VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS verification_codes (
+  discord_id VARCHAR(30) PRIMARY KEY,
+  roblox_id VARCHAR(30) NOT NULL,
+  code VARCHAR(100) NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS verifications (
+  id SERIAL PRIMARY KEY,
+  discord_id VARCHAR(30) NOT NULL,
+  roblox_id VARCHAR(30) NOT NULL,
+  verified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tracked_users (
+  roblox_id VARCHAR(30) PRIMARY KEY,
+  posted BOOLEAN NOT NULL,
+  moderator_id VARCHAR(30) NOT NULL,
+  reason TEXT NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The name of the watch rule the user was posted under
+ALTER TABLE tracked_users ADD COLUMN IF NOT EXISTS posted_rule VARCHAR(50);
+
+CREATE INDEX IF NOT EXISTS tracked_users_created_at_roblox_id ON tracked_users (created_at, roblox_id);
+
+CREATE TABLE IF NOT EXISTS presence_history (
+  roblox_id BIGINT NOT NULL,
+  seen_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  presence SMALLINT NOT NULL,
+  root_place_id BIGINT
+);
+
+CREATE INDEX IF NOT EXISTS presence_history_roblox_id_seen_at ON presence_history (roblox_id, seen_at);
+
+CREATE TABLE IF NOT EXISTS events (
+  discord_id VARCHAR(30) PRIMARY KEY,
+  events INT NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS roblox_cache (
+  kind VARCHAR(20) NOT NULL,
+  key VARCHAR(64) NOT NULL,
+  value JSONB NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (kind, key)
+);
+-- Notify the bot of changes, so its in-memory caches are invalidated
+-- even when the change comes from another instance or manual SQL
+CREATE OR REPLACE FUNCTION notify_bot_change() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('bot_changes', json_build_object(
+    'table', TG_TABLE_NAME,
+    'op', TG_OP,
+    'old', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE to_jsonb(OLD) - 'reason' END,
+    'new', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE to_jsonb(NEW) - 'reason' END
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tracked_users_notify ON tracked_users;
+CREATE TRIGGER tracked_users_notify
+  AFTER INSERT OR UPDATE OR DELETE ON tracked_users
+  FOR EACH ROW EXECUTE FUNCTION notify_bot_change();
+
+DROP TRIGGER IF EXISTS verifications_notify ON verifications;
+CREATE TRIGGER verifications_notify
+  AFTER INSERT OR UPDATE OR DELETE ON verifications
+  FOR EACH ROW EXECUTE FUNCTION notify_bot_change();
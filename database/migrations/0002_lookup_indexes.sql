@@ -0,0 +1,15 @@
+-- Indexes behind the verification and warning lookups
+
+-- A ROBLOX account can only be linked to the same Discord account once
+DELETE FROM verifications duplicate
+USING verifications original
+WHERE duplicate.discord_id = original.discord_id
+  AND duplicate.roblox_id = original.roblox_id
+  AND duplicate.id > original.id;
+
+ALTER TABLE verifications
+  ADD CONSTRAINT verifications_discord_id_roblox_id_key UNIQUE (discord_id, roblox_id);
+
+CREATE INDEX verifications_roblox_id ON verifications (roblox_id);
+
+CREATE INDEX warns_discord_id_server_id ON warns (discord_id, server_id, id);
@@ -0,0 +1,6 @@
+-- Rows used to be inserted with IDs computed by the bot, which left the
+-- SERIAL sequences behind the tables. Move them past the highest ID.
+
+SELECT setval(pg_get_serial_sequence('verifications', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM verifications;
+
+SELECT setval(pg_get_serial_sequence('warns', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM warns;
@@ -0,0 +1,2 @@
+-- Serves the leaderboard pages and rank lookups in events order
+CREATE INDEX events_events_discord_id ON events (events DESC, discord_id);
@@ -1,7 +1,119 @@
 import discord
 from discord.ext import commands
 
-from utils import roblox
+from utils import ratelimit, roblox
+from utils.http import UpstreamUnavailable
+from utils.models import GroupRole
+
+def upstream_unavailable_embed(error: UpstreamUnavailable) -> discord.Embed:
+    """
+    Build the embed shown when an upstream API is unavailable.
+
+    :param error: The raised error.
+    :return: The embed.
+    """
+
+    service = "Bloxlink" if error.host.endswith("blox.link") else "ROBLOX"
+    retry = f" Try again in {round(error.retry_after)} seconds." if error.retry_after else " Try again later."
+
+    return discord.Embed(
+        description=f"{service} is currently unavailable.{retry}",
+        color=discord.Color.red()
+    )
+
+async def send_upstream_unavailable(interaction: discord.Interaction, error: UpstreamUnavailable) -> None:
+    """
+    Tell the user of an interaction that an upstream API is unavailable.
+
+    :param interaction: The interaction.
+    :param error: The raised error.
+    """
+
+    embed = upstream_unavailable_embed(error)
+
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+class UpstreamUnavailableMixin:
+    """
+    Tells the user when a view or modal callback fails because an upstream API is unavailable.
+
+    Goes before discord.ui.View or discord.ui.Modal in the bases.
+    """
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception, *args) -> None:
+        if isinstance(error, UpstreamUnavailable):
+            await send_upstream_unavailable(interaction, error)
+            return
+        await super().on_error(interaction, error, *args) # The item too, for views
+
+def plan_roles(bot: commands.Bot, shirai_ryu_role: GroupRole | None) -> tuple[list[str], list[str]] | None:
+    """
+    Get the roles a verified member should and should not have from their Shirai Ryu rank.
+
+    :param bot: The Discord bot.
+    :param shirai_ryu_role: The member's role in the Shirai Ryu group, or None if not in it.
+
+    :return: The IDs of the roles to add and to remove, or None if the rank has no role.
+    """
+
+    verification_roles = bot.config["roles"]["verification"]
+
+    roles_to_add = [verification_roles["verified"], verification_roles["outsider"], verification_roles["basic_category"]]
+    roles_to_remove = [verification_roles["unverified"]]
+
+    if shirai_ryu_role is None:
+        return roles_to_add, roles_to_remove
+
+    shirai_ryu_rank_id = str(shirai_ryu_role.id) # The role ID (Ex. 112572242)
+
+    rank_role_obj = next((rank for rank in bot.config["ranks"] if rank["group_role"] == shirai_ryu_rank_id), None)
+    rank_type = rank_role_obj["type"] if rank_role_obj else None
+
+    if not rank_role_obj and shirai_ryu_rank_id != verification_roles["faction_supporter_group_role"]:
+        return
+    elif rank_role_obj: # Faction supporters have no rank role of their own
+        roles_to_add.append(rank_role_obj["discord_role"])
+
+    for rank in bot.config["ranks"]:
+        if rank["group_role"] != shirai_ryu_rank_id:
+            roles_to_remove.append(rank["discord_role"])
+
+    if rank_type == "lr":
+        roles_to_add.append(verification_roles["lr_category"])
+        roles_to_remove.append(verification_roles["mr_category"])
+    elif rank_type == "mr":
+        roles_to_add.append(verification_roles["mr_category"])
+        roles_to_remove.append(verification_roles["lr_category"])
+    else:
+        roles_to_remove.append(verification_roles["lr_category"])
+        roles_to_remove.append(verification_roles["mr_category"])
+
+    return roles_to_add, roles_to_remove
+
+def diff_roles(member: discord.Member, roles_to_add: list[str], roles_to_remove: list[str]) -> tuple[list[str], list[str], list[discord.Role]]:
+    """
+    Compare the roles a member should have with the ones they have.
+
+    :param member: The guild member.
+    :param roles_to_add: The IDs of the roles the member should have.
+    :param roles_to_remove: The IDs of the roles the member should not have.
+
+    :return: The IDs of the roles added, the IDs of the roles removed and the member's new roles.
+    """
+
+    current_role_ids = [str(role.id) for role in member.roles]
+
+    # Roles missing from the guild can't be added, so they aren't reported as added either
+    roles_added = [role for role in roles_to_add if role not in current_role_ids and member.guild.get_role(int(role))]
+    roles_removed = [role for role in roles_to_remove if role in current_role_ids]
+
+    member_roles = [role for role in member.roles if str(role.id) not in roles_removed] + [member.guild.get_role(int(role)) for role in roles_added]
+    member_roles = [role for role in member_roles if not role.is_default()]
+
+    return roles_added, roles_removed, member_roles
 
 async def update_user(bot: commands.Bot, member: discord.Member, roblox_id: str | None = None) -> dict | None:
     """
@@ -26,48 +138,15 @@ async def update_user(bot: commands.Bot, member: discord.Member, roblox_id: str
     # ====== GROUPS ======
     # ====================
 
-    current_roles = member.roles
-    roles_to_add = [bot.config["roles"]["verification"]["verified"], bot.config["roles"]["verification"]["outsider"], bot.config["roles"]["verification"]["basic_category"]]
-    roles_to_remove = [bot.config["roles"]["verification"]["unverified"]]
-
-    community_groups = await roblox.get_community_groups(bot, roblox_id)
-    if community_groups:
-        community_groups = list(community_groups)
-        in_shirai_ryu = filter(lambda group: str(group["group"]["id"]) == bot.config["community_groups"][0], community_groups)
-
-        if in_shirai_ryu:
-            in_shirai_ryu = list(in_shirai_ryu)
-            
-            shirai_ryu_rank_name = in_shirai_ryu[0]["role"]["name"] # The role name (Ex. Technician)
-            shirai_ryu_rank = in_shirai_ryu[0]["role"]["rank"] # The rank number (Ex. 254)
-            shirai_ryu_rank_id = in_shirai_ryu[0]["role"]["id"] # The role ID (Ex. 112572242)
-
-            rank_role_obj = filter(lambda r: r.group_role == str(shirai_ryu_rank_id), bot.config.ranks)
-            rank_type = rank_role_obj.type
-
-            if not rank_role_obj and str(shirai_ryu_rank_id) != bot.config['roles']['verification']['faction_supporter_group_role']:
-                return
-            elif str(shirai_ryu_rank_id) == bot.config['roles']['verification']['faction_supporter_group_role']:
-                rank_role_id = bot.config['roles']['verification']['faction_supporter_group_role']
-                roles_to_add.append(rank_role_id)
-            else:
-                rank_role_id = rank_role_obj[0].role_id
-                roles_to_add.append(rank_role_id)
-
-            other_ranks = filter(lambda r: r.group_role != str(shirai_ryu_rank_id), bot.config.ranks)
-
-            for rank in other_ranks:
-                roles_to_remove.append(rank.role_id)
-
-            if rank_type == "lr":
-                roles_to_add.append(bot.config["roles"]["verification"]["lr_category"])
-                roles_to_remove.remove(bot.config["roles"]["verification"]["mr_category"])
-            elif rank_type == "mr":
-                roles_to_add.remove(bot.config["roles"]["verification"]["lr_category"])
-                roles_to_remove.append(bot.config["roles"]["verification"]["mr_category"])
-            else:
-                roles_to_remove.remove(bot.config["roles"]["verification"]["lr_category"])
-                roles_to_remove.remove(bot.config["roles"]["verification"]["mr_category"])
+    community_groups = await roblox.get_community_groups(bot, roblox_id, fresh=True)
+    shirai_ryu_role = next((group for group in community_groups if str(group.group_id) == bot.config["community_groups"][0]), None)
+
+    planned_roles = plan_roles(bot, shirai_ryu_role)
+
+    if planned_roles is None:
+        return
+
+    roles_to_add, roles_to_remove = planned_roles
 
     # ====================
     # ===== NICKNAME =====
@@ -78,7 +157,7 @@ async def update_user(bot: commands.Bot, member: discord.Member, roblox_id: str
     user_information = await roblox.get_user_information(roblox_id)
 
     if user_information:
-        nickname = user_information["name"]
+        nickname = user_information.name
 
     # Update the user's nickname
     nick_error = False # If the bot doesn't have permission to change the nickname
@@ -91,18 +170,83 @@ async def update_user(bot: commands.Bot, member: discord.Member, roblox_id: str
     # --------------------------
 
     # Get the roles that need to be added and removed
-    roles_added = [role for role in roles_to_add if role not in [str(role.id) for role in current_roles]] 
-    roles_removed = [role for role in roles_to_remove if role in [str(role.id) for role in current_roles]]
-
-    member_roles = [role for role in current_roles if str(role.id) not in roles_removed] + [discord.utils.get(member.guild.roles, id=int(role)) for role in roles_added]
+    roles_added, roles_removed, member_roles = diff_roles(member, roles_to_add, roles_to_remove)
     
     await member.edit(roles=member_roles)
 
+    roblox.mark_rank_synced(roblox_id, await roblox.get_community_ranks(bot, roblox_id))
+
     return {
         "nickname": nickname,
         "roles_added": roles_added,
         "roles_removed": roles_removed,
         "nick_error": nick_error
     }
-    
-    
+
+async def sync_guild_roles(bot: commands.Bot, guild: discord.Guild) -> dict:
+    """
+    Update the roles of every verified member of a guild at once.
+
+    Instead of looking up the groups of every member, the whole Shirai Ryu roster
+    is paged through once and joined with the verifications in memory.
+
+    :param bot: The Discord bot.
+    :param guild: The guild.
+
+    :return: The return data.
+    """
+
+    group_id = bot.config["community_groups"][0]
+
+    # roblox_id -> role in the Shirai Ryu group, of every rank so unknown ones are skipped like in update_user
+    shirai_ryu_roles: dict[int, GroupRole] = {}
+
+    with ratelimit.background():
+        async for user, role in roblox.iter_group_members(group_id):
+            shirai_ryu_roles[user.id] = role
+
+    # discord_id -> roblox_id, the first verified account like update_user
+    verified: dict[int, int] = {}
+
+    for verification in await bot.database.get_all_verifications():
+        verified.setdefault(int(verification["discord_id"]), int(verification["roblox_id"]))
+
+    data = {
+        "members": 0,
+        "updated": 0,
+        "skipped": 0,
+        "failed": 0,
+        "roles_added": 0,
+        "roles_removed": 0
+    }
+
+    for member in guild.members:
+        roblox_id = verified.get(member.id)
+
+        if roblox_id is None or member.bot:
+            continue
+
+        data["members"] += 1
+
+        planned_roles = plan_roles(bot, shirai_ryu_roles.get(roblox_id))
+
+        if planned_roles is None:
+            data["skipped"] += 1
+            continue
+
+        roles_added, roles_removed, member_roles = diff_roles(member, *planned_roles)
+
+        if not roles_added and not roles_removed:
+            continue
+
+        try:
+            await member.edit(roles=member_roles)
+        except discord.HTTPException:
+            data["failed"] += 1
+            continue
+
+        data["updated"] += 1
+        data["roles_added"] += len(roles_added)
+        data["roles_removed"] += len(roles_removed)
+
+    return data
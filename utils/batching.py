@@ -0,0 +1,114 @@
+import asyncio
+
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def chunked(items: Iterable[T], size: int) -> list[list[T]]:
+    """
+    Split items into lists of at most size elements.
+
+    :param items: The items to split.
+    :param size: The maximum size of a chunk.
+    :return: The chunks, in order.
+    """
+
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1.")
+
+    items = list(items)
+
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+async def gather_chunks(
+    items: Iterable[T], size: int, fetch: Callable[[list[T]], Awaitable[R]], *, concurrency: int = 4
+) -> list[R]:
+    """
+    Fetch items in chunks concurrently, with at most concurrency chunks in flight.
+
+    :param items: The items to fetch.
+    :param size: The maximum size of a chunk.
+    :param fetch: The coroutine function called with every chunk.
+    :param concurrency: The maximum number of chunks fetched at the same time.
+    :return: The result of every chunk, in chunk order.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(chunk: list[T]) -> R:
+        async with semaphore:
+            return await fetch(chunk)
+
+    return await asyncio.gather(*(run(chunk) for chunk in chunked(items, size)))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class BatchLoader(Generic[K, V]):
+    """
+    Collects keys requested around the same time and loads them in one call.
+
+    Every key asked for within delay seconds of the first one, or until max_size keys
+    are pending, is passed to a single call of the load function.
+    """
+
+    def __init__(self, load: Callable[[list[K]], Awaitable[dict[K, V]]], *, delay: float = 0.01, max_size: int = 100) -> None:
+        """
+        :param load: Loads a list of keys into a dict of key to value, leaving out keys that don't exist.
+        :param delay: The time in seconds pending keys are collected for.
+        :param max_size: The maximum number of keys loaded at once.
+        """
+        self._load = load
+        self.delay = delay
+        self.max_size = max_size
+        self._pending: dict[K, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        """
+        Load one key as part of the next batch.
+
+        :param key: The key.
+        :return: The value, or None if it doesn't exist.
+        """
+
+        future = self._pending.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+
+            if len(self._pending) >= self.max_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.delay, self._dispatch)
+
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, {}
+
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[K, asyncio.Future]) -> None:
+        try:
+            results = await self._load(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
@@ -0,0 +1,237 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class _Sentinel:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def __bool__(self) -> bool:
+        return False
+
+MISSING = _Sentinel("MISSING") # The key is not cached
+NOT_FOUND = _Sentinel("NOT_FOUND") # The key is cached as not existing upstream
+
+class TTLCache:
+    """
+    A size-bounded, least-recently-used cache whose entries expire.
+
+    Besides values, a key can be cached as NOT_FOUND so that lookups of things
+    that do not exist upstream are not repeated on every call.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, *, negative_ttl: float | None = None) -> None:
+        """
+        :param maxsize: The maximum number of entries kept.
+        :param ttl: The default time to live of an entry in seconds.
+        :param negative_ttl: (Optional) The time to live of NOT_FOUND entries, defaults to ttl.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not MISSING
+
+    def get(self, key: Hashable, *, count: bool = True) -> Any:
+        """
+        Get a cached value.
+
+        :param key: The key.
+        :param count: Whether the lookup counts towards the hit/miss counters.
+        :return: The value, NOT_FOUND for a negative entry, or MISSING.
+        """
+
+        entry = self._data.get(key)
+
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            entry = None
+
+        if entry is None:
+            if count:
+                self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+
+        if count:
+            self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, *, ttl: float | None = None) -> None:
+        """
+        Cache a value.
+
+        :param key: The key.
+        :param value: The value, or NOT_FOUND for a negative entry.
+        :param ttl: (Optional) The time to live in seconds, overriding the default.
+        """
+
+        if ttl is None:
+            ttl = self.negative_ttl if value is NOT_FOUND else self.ttl
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set_not_found(self, key: Hashable) -> None:
+        self.set(key, NOT_FOUND)
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Drop a cached entry.
+
+        :param key: The key.
+        :return: Whether an entry was dropped.
+        """
+
+        return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class PersistentCache:
+    """
+    A database-backed tier behind the in-memory caches, so a restart comes up warm.
+
+    Entries are read lazily when the in-memory cache misses, and written behind:
+    writes are queued and flushed in one batch every flush_interval seconds.
+    """
+
+    def __init__(self, database, *, flush_interval: float = 30.0, max_pending: int = 1_000) -> None:
+        """
+        :param database: The database manager.
+        :param flush_interval: The time in seconds between flushes.
+        :param max_pending: The number of queued writes that triggers an early flush.
+        """
+        self.database = database
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.loaded = 0
+        self.written = 0
+        self._pending: dict[tuple[str, str], tuple[Any, float]] = {}
+        self._flusher: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def close(self) -> None:
+        """
+        Stop flushing in the background and write everything still queued.
+        """
+
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+        await self.flush()
+
+    async def load(self, kind: str, keys: list[Hashable]) -> dict[Hashable, tuple[Any, float]]:
+        """
+        Read unexpired entries.
+
+        :param kind: The kind of entry, ex. "user".
+        :param keys: The keys.
+        :return: The value and remaining time to live in seconds, by key.
+        """
+
+        if not keys:
+            return {}
+
+        by_key = {str(key): key for key in keys}
+        rows = await self.database.get_cached_lookups(kind, list(by_key))
+
+        self.loaded += len(rows)
+
+        return {by_key[key]: (value, ttl) for key, (value, ttl) in rows.items()}
+
+    def write(self, kind: str, key: Hashable, value: Any, ttl: float) -> None:
+        """
+        Queue an entry to be written.
+
+        :param kind: The kind of entry, ex. "user".
+        :param key: The key.
+        :param value: The JSON-serializable value.
+        :param ttl: The time to live in seconds.
+        """
+
+        self._pending[(kind, str(key))] = (value, time.time() + ttl)
+
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """
+        Write every queued entry in one batch.
+        """
+
+        pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        entries = [(kind, key, value, expires_at) for (kind, key), (value, expires_at) in pending.items()]
+
+        try:
+            await self.database.set_cached_lookups(entries)
+        except Exception:
+            for (kind, key), entry in pending.items(): # Retry with the next flush, unless overwritten since
+                self._pending.setdefault((kind, key), entry)
+            raise
+
+        self.written += len(entries)
+
+    async def _flush_loop(self) -> None:
+        try:
+            await self.database.prune_cached_lookups()
+        except Exception:
+            pass
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                pass # The entries stay queued for the next flush
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "loaded": self.loaded,
+            "written": self.written,
+        }
@@ -1,6 +1,9 @@
 import discord
 from discord import app_commands, Interaction
 
+from utils import _discord
+from utils.http import UpstreamUnavailable
+
 class BotCommandTree(app_commands.CommandTree):
   async def on_error(self, interaction: Interaction, error: app_commands.AppCommandError):
     if isinstance(error, app_commands.CommandOnCooldown):
@@ -10,4 +13,6 @@ class BotCommandTree(app_commands.CommandTree):
             description="Missing required role to execute this command.", 
             color=discord.Color.red()
         )
-        await interaction.response.send_message(embed=embed)
\ No newline at end of file
+        await interaction.response.send_message(embed=embed)
+    elif isinstance(error, app_commands.CommandInvokeError) and isinstance(error.original, UpstreamUnavailable):
+        await _discord.send_upstream_unavailable(interaction, error.original)
\ No newline at end of file
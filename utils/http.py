@@ -0,0 +1,289 @@
+import asyncio
+import time
+import aiohttp
+
+from yarl import URL
+
+from utils.ratelimit import RateLimiter
+
+class HTTPResponse:
+    """
+    A fully read HTTP response.
+
+    The body is read before the connection is handed back to the pool, so callers
+    never have to manage the underlying aiohttp response themselves.
+    """
+
+    __slots__ = ("status", "headers", "data")
+
+    def __init__(self, status: int, headers: dict, data: dict | list | None) -> None:
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> dict | list | None:
+        return self.data
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised when an upstream API is down, too slow, or its circuit breaker is open.
+    """
+
+    def __init__(self, host: str, retry_after: float | None = None) -> None:
+        """
+        :param host: The host of the upstream API.
+        :param retry_after: (Optional) The time in seconds until the upstream is tried again.
+        """
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"{host} is currently unavailable.")
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an upstream after consecutive failures.
+
+    Once failure_threshold requests in a row failed the circuit opens and every call
+    is short-circuited for reset_timeout seconds. After that, a single probe request
+    is let through (half-open): it closes the circuit if it succeeds, or opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, *, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        """
+        :param failure_threshold: The number of consecutive failures that opens the circuit.
+        :param reset_timeout: The time in seconds the circuit stays open before probing.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Check whether a request may be sent, claiming the probe when half-open.
+
+        :return: Whether the request may be sent.
+        """
+
+        state = self.state
+
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+
+        self.short_circuited += 1
+        return False
+
+    def release(self) -> None:
+        """
+        Give back the probe of a request that was cancelled before it completed.
+        """
+
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def metrics(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": self.retry_after() if self.state == self.OPEN else 0.0,
+            "short_circuited": self.short_circuited,
+        }
+
+class HTTPClient:
+    """
+    A shared, non-blocking HTTP client.
+
+    Keeps one keep-alive connection pool per host so that every helper talking to
+    the same API reuses its connections instead of opening a new one per call.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 10.0,
+        limit_per_host: int = 20,
+        user_agent: str = "shirai-ryu",
+        rate_limiter: RateLimiter | None = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ) -> None:
+        """
+        :param timeout: The default total timeout of a request in seconds.
+        :param limit_per_host: The maximum number of open connections per host.
+        :param user_agent: The user agent sent with every request.
+        :param rate_limiter: (Optional) The rate limiter every request waits on.
+        :param failure_threshold: The number of consecutive failures that opens a host's circuit.
+        :param reset_timeout: The time in seconds a host's circuit stays open before probing.
+        """
+        self.rate_limiter = rate_limiter
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.timeout = timeout
+        self.limit_per_host = limit_per_host
+        self.user_agent = user_agent
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+        self._closed = False
+
+    def _session(self, host: str) -> aiohttp.ClientSession:
+        if self._closed:
+            raise RuntimeError("HTTP client is closed.")
+
+        session = self._sessions.get(host)
+
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit_per_host,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": self.user_agent},
+                raise_for_status=False,
+            )
+            self._sessions[host] = session
+
+        return session
+
+    async def request(self, method: str, url: str, *, timeout: float | None = None, **kwargs) -> HTTPResponse:
+        """
+        Send a request through the pool of the URL's host.
+
+        With a rate limiter, the request waits for its endpoint's budget and is
+        retried when it gets a 429 response. An interactive request that would
+        wait longer than the limiter's max_interactive_wait raises UpstreamUnavailable.
+
+        Connection errors, timeouts and 5xx responses count against the host's
+        circuit breaker and raise UpstreamUnavailable, as does any call made while
+        the circuit is open.
+
+        :param method: The HTTP method.
+        :param url: The full URL.
+        :param timeout: (Optional) The total timeout in seconds, overriding the default.
+        :return: The read response.
+        """
+
+        breaker = self.breaker(URL(url).host)
+
+        if breaker.state == breaker.OPEN: # Fail fast instead of waiting for a rate limit token first
+            breaker.short_circuited += 1
+            raise UpstreamUnavailable(URL(url).host, breaker.retry_after())
+
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        if self.rate_limiter is None:
+            return await self._send(method, url, **kwargs)
+
+        attempt = 0
+
+        while True:
+            # Someone waiting on an interaction has 3 seconds for a response, so fail fast instead of waiting past them
+            delay = self.rate_limiter.too_long(url)
+
+            if delay is not None:
+                raise UpstreamUnavailable(URL(url).host, delay)
+
+            await self.rate_limiter.acquire(url)
+
+            response = await self._send(method, url, **kwargs)
+            self.rate_limiter.update(url, response.status, response.headers, attempt)
+
+            if response.status != 429 or attempt >= self.rate_limiter.max_retries:
+                return response
+
+            attempt += 1
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout)
+            self.breakers[host] = breaker
+
+        return breaker
+
+    async def _send(self, method: str, url: str, **kwargs) -> HTTPResponse:
+        host = URL(url).host
+        breaker = self.breaker(host)
+
+        if not breaker.allow():
+            raise UpstreamUnavailable(host, breaker.retry_after())
+
+        session = self._session(host)
+
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+
+                response = HTTPResponse(response.status, dict(response.headers), data)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            raise UpstreamUnavailable(host) from e
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure()
+            raise UpstreamUnavailable(host)
+
+        breaker.record_success()
+
+        return response
+
+    async def get(self, url: str, **kwargs) -> HTTPResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HTTPResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """
+        Close every connection pool.
+        """
+
+        self._closed = True
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+
+        await asyncio.gather(*(session.close() for session in sessions if not session.closed))
@@ -0,0 +1,144 @@
+class RobloxUser:
+    """
+    A ROBLOX user, parsed from the users API.
+    """
+
+    __slots__ = ("id", "name", "display_name", "has_verified_badge", "description")
+
+    def __init__(
+        self, id: int, name: str, display_name: str | None = None, has_verified_badge: bool = False, description: str | None = None
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.display_name = display_name or name
+        self.has_verified_badge = has_verified_badge
+        self.description = description # Only known when fetched with get_user_information
+
+    def __repr__(self) -> str:
+        return f"<RobloxUser id={self.id} name={self.name!r}>"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "RobloxUser":
+        return cls(
+            id=int(data["id"]),
+            name=data["name"],
+            display_name=data.get("displayName"),
+            has_verified_badge=data.get("hasVerifiedBadge", False),
+            description=data.get("description"),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "displayName": self.display_name,
+            "hasVerifiedBadge": self.has_verified_badge,
+            "description": self.description,
+        }
+
+    @property
+    def profile(self) -> str:
+        return f"https://www.roblox.com/users/{self.id}/profile"
+
+class UserPresence:
+    """
+    The presence of a ROBLOX user, parsed from the presence API.
+    """
+
+    __slots__ = ("user_id", "type", "place_id", "root_place_id", "universe_id", "game_id", "last_location")
+
+    OFFLINE = 0
+    ONLINE = 1
+    IN_GAME = 2
+    IN_STUDIO = 3
+
+    def __init__(
+        self,
+        user_id: int,
+        type: int,
+        place_id: int | None = None,
+        root_place_id: int | None = None,
+        universe_id: int | None = None,
+        game_id: str | None = None,
+        last_location: str | None = None
+    ) -> None:
+        self.user_id = user_id
+        self.type = type
+        self.place_id = place_id
+        self.root_place_id = root_place_id # None when the user's joins are off
+        self.universe_id = universe_id
+        self.game_id = game_id
+        self.last_location = last_location
+
+    def __repr__(self) -> str:
+        return f"<UserPresence user_id={self.user_id} type={self.type} root_place_id={self.root_place_id}>"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "UserPresence":
+        return cls(
+            user_id=int(data["userId"]),
+            type=data["userPresenceType"],
+            place_id=data.get("placeId"),
+            root_place_id=data.get("rootPlaceId"),
+            universe_id=data.get("universeId"),
+            game_id=data.get("gameId"),
+            last_location=data.get("lastLocation"),
+        )
+
+    @property
+    def in_game(self) -> bool:
+        return self.type == self.IN_GAME
+
+class GroupRole:
+    """
+    A user's role in a ROBLOX group, parsed from the groups API.
+    """
+
+    __slots__ = ("group_id", "id", "name", "rank")
+
+    def __init__(self, group_id: int, id: int, name: str, rank: int) -> None:
+        self.group_id = group_id
+        self.id = id
+        self.name = name # Ex. Technician
+        self.rank = rank # Ex. 254
+
+    def __repr__(self) -> str:
+        return f"<GroupRole group_id={self.group_id} id={self.id} name={self.name!r} rank={self.rank}>"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "GroupRole":
+        if "group" in data: # A membership: {"group": {...}, "role": {...}}
+            return cls(group_id=int(data["group"]["id"]), id=int(data["role"]["id"]), name=data["role"]["name"], rank=data["role"]["rank"])
+
+        return cls(group_id=int(data["groupId"]), id=int(data["id"]), name=data["name"], rank=data["rank"])
+
+    def to_json(self) -> dict:
+        return {
+            "groupId": self.group_id,
+            "id": self.id,
+            "name": self.name,
+            "rank": self.rank,
+        }
+
+class Thumbnail:
+    """
+    A ROBLOX thumbnail, parsed from the thumbnails API.
+    """
+
+    __slots__ = ("target_id", "state", "image_url")
+
+    def __init__(self, target_id: int, state: str, image_url: str | None) -> None:
+        self.target_id = target_id
+        self.state = state
+        self.image_url = image_url
+
+    def __repr__(self) -> str:
+        return f"<Thumbnail target_id={self.target_id} state={self.state!r}>"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Thumbnail":
+        return cls(target_id=int(data["targetId"]), state=data["state"], image_url=data.get("imageUrl"))
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "Completed" and bool(self.image_url)
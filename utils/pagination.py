@@ -0,0 +1,101 @@
+import math
+import discord
+
+from typing import Any
+
+class KeysetPageView(discord.ui.View):
+    """
+    Pages through rows read with a keyset cursor, with Previous and Next buttons.
+
+    Subclasses read a page with fetch(), tell the cursor of a row with cursor()
+    and turn a page into an embed with render_page().
+    """
+
+    PAGE_SIZE = 10
+
+    def __init__(self, author_id: int, total: int, *, timeout: float = 300) -> None:
+        """
+        :param author_id: The ID of the only user who can turn the pages.
+        :param total: The number of rows, for the page count.
+        :param timeout: The time in seconds after which the buttons stop working.
+        """
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.total = total
+        self.cursors: list[tuple | None] = [None] # The cursor each visited page starts after
+        self.carries: list[Any] = [None] # What render_page() passed on to each visited page
+        self.page = 0
+        self.next_cursor: tuple | None = None
+        self.next_carry: Any = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def fetch(self, after: tuple | None, limit: int) -> list[dict]:
+        """
+        Read a page of rows.
+
+        :param after: The cursor of the row before the page, or None for the first page.
+        :param limit: The maximum number of rows.
+        :return: The rows, in order.
+        """
+
+        raise NotImplementedError
+
+    def cursor(self, row: dict) -> tuple:
+        raise NotImplementedError
+
+    async def render_page(self, rows: list[dict], position: int, carry: Any) -> tuple[discord.Embed, Any]:
+        """
+        Build the embed of a page.
+
+        :param rows: The rows of the page.
+        :param position: The position of the first row, starting at 1.
+        :param carry: What rendering the previous page passed on, or None for the first page.
+        :return: The embed, and what to pass on to the next page.
+        """
+
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        return f"Page {self.page + 1}/{max(1, math.ceil(self.total / self.PAGE_SIZE))}"
+
+    async def render(self) -> discord.Embed:
+        """
+        Build the embed of the current page.
+
+        :return: The embed.
+        """
+
+        # One extra row tells whether there is a next page
+        rows = await self.fetch(self.cursors[self.page], self.PAGE_SIZE + 1)
+        has_next = len(rows) > self.PAGE_SIZE
+        rows = rows[:self.PAGE_SIZE]
+
+        self.next_cursor = self.cursor(rows[-1]) if has_next else None
+
+        embed, self.next_carry = await self.render_page(rows, self.page * self.PAGE_SIZE + 1, self.carries[self.page])
+        embed.set_footer(text=self.footer())
+
+        self.previous.disabled = self.page == 0
+        self.next.disabled = not has_next
+
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.page -= 1
+
+        await interaction.response.defer() # Rendering may have to look things up first
+        await interaction.edit_original_response(embed=await self.render(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.page += 1
+
+        if self.page == len(self.cursors):
+            self.cursors.append(self.next_cursor)
+            self.carries.append(self.next_carry)
+
+        await interaction.response.defer() # Rendering may have to look things up first
+        await interaction.edit_original_response(embed=await self.render(), view=self)
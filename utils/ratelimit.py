@@ -0,0 +1,296 @@
+import asyncio
+import contextlib
+import contextvars
+import email.utils
+import heapq
+import itertools
+import random
+import re
+import time
+
+from yarl import URL
+
+INTERACTIVE = 0 # Slash commands and other requests someone is waiting on
+BACKGROUND = 1 # Tasks such as the tracker polling
+
+_priority = contextvars.ContextVar("ratelimit_priority", default=INTERACTIVE)
+
+@contextlib.contextmanager
+def priority(level: int):
+    """
+    Send every request made inside the block with the given priority.
+
+    :param level: The priority, lower goes first.
+    """
+
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def background():
+    """
+    Send every request made inside the block behind interactive ones.
+    """
+
+    return priority(BACKGROUND)
+
+def current_priority() -> int:
+    return _priority.get()
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header, in seconds or as an HTTP date.
+
+    :param value: The header value.
+    :return: The delay in seconds, or None if it cannot be parsed.
+    """
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, date.timestamp() - time.time())
+
+def _header(headers: dict, name: str) -> str | None:
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+class TokenBucket:
+    """
+    A token bucket whose waiters are served by priority, then in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.remaining = None # As last reported by the server
+        self.throttled = 0 # Number of 429 responses
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._drainer: asyncio.Task | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """
+        Get the time until a token is available.
+
+        :return: The delay in seconds.
+        """
+
+        now = time.monotonic()
+
+        if self.blocked_until > now:
+            return self.blocked_until - now
+
+        self._refill()
+
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, priority: int | None = None) -> None:
+        """
+        Wait for a token and take it.
+
+        :param priority: (Optional) The priority, defaults to the one of the current context.
+        """
+
+        if priority is None:
+            priority = current_priority()
+
+        if not self._waiters and self.delay() == 0:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.ensure_future(self._drain())
+
+        await future
+
+    async def _drain(self) -> None:
+        while self._waiters:
+            delay = self.delay()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+
+            if future.done(): # The waiter was cancelled
+                continue
+
+            self.tokens -= 1
+            future.set_result(None)
+
+    def block(self, seconds: float) -> None:
+        """
+        Hand out no tokens for the given time.
+
+        :param seconds: The time in seconds.
+        """
+
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update(self, headers: dict) -> None:
+        """
+        Adjust the bucket to the rate limit headers of a response.
+
+        :param headers: The response headers.
+        """
+
+        limit = _header(headers, "x-ratelimit-limit") # Ex. "60, 60;w=60"
+        remaining = _header(headers, "x-ratelimit-remaining")
+        reset = _header(headers, "x-ratelimit-reset")
+
+        if limit:
+            count = re.match(r"\s*(\d+)", limit)
+            window = re.search(r"w=(\d+)", limit)
+
+            if count and window and int(window.group(1)) > 0:
+                self.capacity = max(1, int(count.group(1)))
+                self.rate = self.capacity / int(window.group(1))
+
+        if remaining is not None and remaining.strip().isdigit():
+            self.remaining = int(remaining)
+            self._refill()
+            self.tokens = min(self.tokens, self.remaining)
+
+            if self.remaining == 0:
+                delay = parse_retry_after(reset)
+
+                if delay:
+                    self.block(delay)
+
+    def metrics(self) -> dict:
+        self._refill()
+
+        return {
+            "tokens": self.tokens,
+            "capacity": self.capacity,
+            "rate": self.rate,
+            "remaining": self.remaining,
+            "waiting": sum(not future.done() for _, _, future in self._waiters),
+            "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+            "throttled": self.throttled,
+        }
+
+class RateLimiter:
+    """
+    Keeps a token bucket per host and endpoint and backs off on 429 responses.
+    """
+
+    def __init__(
+        self, *, rate: float = 1.0, capacity: float = 10, max_retries: int = 3, backoff: float = 1.0, max_backoff: float = 30.0,
+        max_interactive_wait: float = 2.0
+    ) -> None:
+        """
+        :param rate: The default number of requests per second of an endpoint.
+        :param capacity: The default burst size of an endpoint.
+        :param max_retries: The maximum number of times a 429 response is retried.
+        :param backoff: The base delay of the exponential backoff in seconds.
+        :param max_backoff: The maximum delay of the exponential backoff in seconds.
+        :param max_interactive_wait: The longest an interactive request waits for a token, in seconds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.max_retries = max_retries
+        self.max_interactive_wait = max_interactive_wait
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.buckets: dict[str, TokenBucket] = {}
+
+    @staticmethod
+    def key(url: str) -> str:
+        """
+        Get the bucket key of a URL: its host and path with IDs left out.
+
+        :param url: The URL.
+        :return: The key.
+        """
+
+        url = URL(url)
+        path = "/".join("{id}" if segment.isdigit() else segment for segment in url.path.split("/"))
+
+        return f"{url.host}{path}"
+
+    def bucket(self, url: str) -> TokenBucket:
+        key = self.key(url)
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+            self.buckets[key] = bucket
+
+        return bucket
+
+    async def acquire(self, url: str) -> None:
+        await self.bucket(url).acquire()
+
+    def too_long(self, url: str) -> float | None:
+        """
+        Check whether an interactive request would wait too long for a token, ex. behind a Retry-After.
+
+        :param url: The URL of the request.
+        :return: The wait in seconds if it is too long for someone waiting on the request, else None.
+        """
+
+        if current_priority() != INTERACTIVE:
+            return None
+
+        delay = self.bucket(url).delay()
+
+        return delay if delay > self.max_interactive_wait else None
+
+    def update(self, url: str, status: int, headers: dict, attempt: int = 0) -> None:
+        """
+        Record a response, blocking its bucket when it was rate limited.
+
+        :param url: The URL of the request.
+        :param status: The status of the response.
+        :param headers: The headers of the response.
+        :param attempt: The number of times the request was already retried.
+        """
+
+        bucket = self.bucket(url)
+        bucket.update(headers)
+
+        if status == 429:
+            bucket.throttled += 1
+
+            delay = parse_retry_after(_header(headers, "retry-after"))
+
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+
+            bucket.block(delay + random.uniform(0, self.backoff)) # Jitter so waiters don't retry in lockstep
+
+    def metrics(self) -> dict:
+        return {key: bucket.metrics() for key, bucket in self.buckets.items()}
@@ -1,78 +1,378 @@
-import requests
-import os
+import asyncio
+import hashlib
 import json
+import os
+from typing import AsyncIterator
 from discord.ext import commands
+from yarl import URL
+
+from utils.batching import BatchLoader, gather_chunks
+from utils.cache import NOT_FOUND, MISSING, PersistentCache, TTLCache
+from utils.http import HTTPClient, UpstreamUnavailable
+from utils.models import GroupRole, RobloxUser, Thumbnail, UserPresence
+from utils.singleflight import SingleFlight, coalesce
+
+USERS_BATCH_SIZE = 100 # users.roblox.com accepts at most 100 ids per request
+PRESENCES_BATCH_SIZE = 50 # presence.roblox.com accepts at most 50 ids per request
+THUMBNAILS_BATCH_SIZE = 100 # thumbnails.roblox.com accepts at most 100 ids per request
+
+# Usernames rarely change, so identity lookups are cached for an hour.
+# Lookups of users that do not exist are cached for a shorter time.
+user_cache = TTLCache(maxsize=10_000, ttl=3600, negative_ttl=300) # user id -> RobloxUser
+name_cache = TTLCache(maxsize=10_000, ttl=3600, negative_ttl=300) # lowercased name -> user id
+information_cache = TTLCache(maxsize=2_000, ttl=300, negative_ttl=300) # user id -> RobloxUser with description
+avatar_cache = TTLCache(maxsize=5_000, ttl=1800) # user id -> headshot image url
+group_rank_cache = TTLCache(maxsize=10_000, ttl=600) # user id -> community group ranks
+synced_rank_cache = TTLCache(maxsize=10_000, ttl=86400) # user id -> hash of the ranks last synced to Discord
+
+# Concurrent callers asking for the same resource share one in-flight request
+in_flight = SingleFlight()
+
+_client: HTTPClient | None = None
+_persistent: PersistentCache | None = None
+_batch_concurrency = 4
+
+def setup(client: HTTPClient, *, batch_concurrency: int = 4, persistent: PersistentCache | None = None) -> None:
+    """
+    Set the HTTP client every ROBLOX helper sends its requests through.
 
-async def get_users_by_ids(user_ids: list[int]) -> dict:
+    :param client: The shared HTTP client.
+    :param batch_concurrency: The maximum number of bulk lookup chunks fetched at the same time.
+    :param persistent: (Optional) The persistent tier behind the lookup caches.
     """
-    Get the ROBLOX user by ID.
 
-    :param user_id: The user ID.
-    :return: The ROBLOX user.
+    global _client, _batch_concurrency, _persistent
+    _client = client
+    _batch_concurrency = batch_concurrency
+    _persistent = persistent
+
+def _http() -> HTTPClient:
+    if _client is None:
+        raise RuntimeError("The ROBLOX HTTP client has not been set up.")
+    return _client
+
+def _unavailable(url: str) -> UpstreamUnavailable:
+    """
+    Build the error raised when a request still failed after its retries, ex. a 429.
+    """
+
+    rate_limiter = _http().rate_limiter
+    retry_after = rate_limiter.bucket(url).delay() if rate_limiter else None
+
+    return UpstreamUnavailable(URL(url).host, retry_after or None)
+
+def _remember(kind: str, cache: TTLCache, key, value) -> None:
+    """
+    Cache a value in memory and queue it for the persistent tier.
+    """
+
+    cache.set(key, value)
+
+    if _persistent is not None:
+        _persistent.write(kind, key, value.to_json() if hasattr(value, "to_json") else value, cache.ttl)
+
+async def _warm(kind: str, cache: TTLCache, keys: list, model: type | None = None) -> None:
+    """
+    Fill the in-memory cache with the entries of the persistent tier for the given keys.
+    """
+
+    if _persistent is None or not keys:
+        return
+
+    try:
+        entries = await _persistent.load(kind, keys)
+    except Exception:
+        return # The persistent tier is optional, the API is asked instead
+
+    for key, (value, ttl) in entries.items():
+        cache.set(key, model.from_json(value) if model else value, ttl=ttl)
+
+def _cache_user(user: RobloxUser) -> None:
+    if user.description is not None: # Descriptions change, they are only kept in the information cache
+        user = RobloxUser(user.id, user.name, user.display_name, user.has_verified_badge)
+
+    _remember("user", user_cache, user.id, user)
+    _remember("name", name_cache, user.name.lower(), user.id)
+
+def invalidate_user(user_id: int | None = None, user_name: str | None = None) -> None:
+    """
+    Drop a ROBLOX user from the lookup caches.
+
+    :param user_id: (Optional) The user ID.
+    :param user_name: (Optional) The user name.
+    """
+
+    if user_id is not None:
+        user = user_cache.get(int(user_id), count=False)
+
+        if user:
+            name_cache.invalidate(user.name.lower())
+
+        user_cache.invalidate(int(user_id))
+        information_cache.invalidate(int(user_id))
+        avatar_cache.invalidate(int(user_id))
+        group_rank_cache.invalidate(int(user_id))
+
+    if user_name is not None:
+        name_cache.invalidate(user_name.lower())
+
+def rate_limit_stats() -> dict:
+    """
+    Get the remaining budget of every endpoint that was requested.
+
+    :return: The metrics of every rate limit bucket by endpoint.
+    """
+
+    if _client is None or _client.rate_limiter is None:
+        return {}
+    return _client.rate_limiter.metrics()
+
+def circuit_stats() -> dict:
+    """
+    Get the state of the circuit breaker of every upstream.
+
+    :return: The metrics of every circuit breaker by host.
+    """
+
+    if _client is None:
+        return {}
+    return {host: breaker.metrics() for host, breaker in _client.breakers.items()}
+
+def persistent_cache_stats() -> dict | None:
+    """
+    Get the counters of the persistent tier.
+
+    :return: The stats, or None if there is no persistent tier.
+    """
+
+    if _persistent is None:
+        return None
+    return _persistent.stats()
+
+def cache_stats() -> dict:
+    """
+    Get the hit/miss counters of the lookup caches.
+
+    :return: The stats of every cache by name.
+    """
+
+    return {
+        "users": user_cache.stats(),
+        "names": name_cache.stats(),
+        "information": information_cache.stats(),
+        "avatars": avatar_cache.stats(),
+        "ranks": group_rank_cache.stats(),
+    }
+
+def coalescing_stats() -> dict:
+    """
+    Get how many requests were shared between concurrent callers.
+
+    :return: The single-flight stats.
+    """
+
+    return in_flight.stats()
+
+async def _post_batches(url: str, key: str, user_ids: list[int], size: int, headers: dict) -> list[dict]:
+    """
+    POST the user IDs to a bulk endpoint in chunks and merge the results.
+
+    :param url: The bulk endpoint.
+    :param key: The key of the result list in the response.
+    :param user_ids: The user IDs.
+    :param size: The maximum number of IDs the endpoint accepts per request.
+    :param headers: The request headers.
+    :return: The merged result lists.
+    """
+
+    user_ids = list(dict.fromkeys(user_ids)) # drop duplicates, keep order
+
+    async def fetch(chunk: list[int]) -> dict:
+        response = await _http().post(url, headers=headers, json={"userIds": chunk})
+        return response.json()
+
+    results = await gather_chunks(user_ids, size, fetch, concurrency=_batch_concurrency)
+
+    merged = []
+
+    for result in results:
+        if not isinstance(result, dict) or key not in result:
+            raise _unavailable(url) # Probably still rate limited after retrying
+
+        merged.extend(result[key])
+
+    return merged
+
+@coalesce(in_flight, key=lambda user_ids: tuple(int(user_id) for user_id in user_ids))
+async def get_users_by_ids(user_ids: list[int]) -> dict[int, RobloxUser]:
+    """
+    Get the ROBLOX users by IDs.
+
+    Any number of IDs is accepted, they are requested in concurrent chunks.
+    Cached users are not requested again.
+
+    :param user_ids: The user IDs.
+    :return: The ROBLOX users by ID, in the requested order. Users that don't exist are left out.
     """
     
     url = "https://users.roblox.com/v1/users"
-    
-    data = json.dumps({
-        "userIds": user_ids
-    })
 
     headers = {
         "accept": "application/json",
         "Content-Type": "application/json"
     }
 
-    response = requests.post(url, headers=headers, data=data)
+    user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    missing_ids = [user_id for user_id in user_ids if user_cache.get(user_id) is MISSING]
+
+    if missing_ids:
+        await _warm("user", user_cache, missing_ids, RobloxUser)
+        missing_ids = [user_id for user_id in missing_ids if user_cache.get(user_id, count=False) is MISSING]
+
+    if missing_ids:
+        users = [RobloxUser.from_json(user) for user in await _post_batches(url, "data", missing_ids, USERS_BATCH_SIZE, headers)]
+
+        for user in users:
+            _cache_user(user)
+
+        found_ids = {user.id for user in users}
+
+        for user_id in missing_ids:
+            if user_id not in found_ids:
+                user_cache.set_not_found(user_id)
 
-    return response.json()
+    users = {}
 
-async def get_user_by_name(user_name: str) -> dict:
+    for user_id in user_ids:
+        user = user_cache.get(user_id, count=False)
+
+        if user:
+            users[user_id] = user
+
+    return users
+
+@coalesce(in_flight, key=lambda user_name: user_name.lower())
+async def get_user_by_name(user_name: str) -> RobloxUser | None:
     """
     Get the ROBLOX user by name.
 
     :param user_name: The user name.
-    :return: The ROBLOX user.
+    :return: The ROBLOX user, or None if they don't exist.
     """
     
     url = "https://users.roblox.com/v1/usernames/users"
-    
-    data = json.dumps({
-        "usernames": [user_name]
-    })
 
     headers = {
         "accept": "application/json",
         "Content-Type": "application/json"
     }
 
-    response = requests.post(url, headers=headers, data=data)
+    user_id = name_cache.get(user_name.lower())
 
-    return response.json()
+    if user_id is MISSING:
+        await _warm("name", name_cache, [user_name.lower()])
+        user_id = name_cache.get(user_name.lower(), count=False)
 
-async def get_user_avatar(user_id: str) -> dict:
-    response = requests.get(
-      f"https://thumbnails.roblox.com/v1/users/avatar-headshot?userIds={user_id}&size=48x48&format=Png&isCircular=false"
-    )
+    if user_id is NOT_FOUND:
+        return None
+    elif user_id is not MISSING:
+        return (await get_users_by_ids([user_id])).get(user_id)
 
+    response = await _http().post(url, headers=headers, json={"usernames": [user_name]})
     data = response.json()
 
-    data = data['data'][0]
-    
-    return data['imageUrl']
+    if not isinstance(data, dict) or "data" not in data:
+        raise _unavailable(url) # Probably still rate limited after retrying
+
+    if not data["data"]:
+        name_cache.set_not_found(user_name.lower())
+        return None
+
+    user = RobloxUser.from_json(data["data"][0])
+    _cache_user(user)
+
+    return user
+
+async def _fetch_avatars(user_ids: list[int]) -> dict[int, str]:
+    """
+    Fetch avatar headshots, in chunks, skipping cached ones.
+
+    :param user_ids: The user IDs.
+    :return: The image URL by user ID for the avatars that are ready.
+    """
+
+    async def fetch(chunk: list[int]) -> dict:
+        response = await _http().get(
+            "https://thumbnails.roblox.com/v1/users/avatar-headshot",
+            params={"userIds": ",".join(map(str, chunk)), "size": "48x48", "format": "Png", "isCircular": "false"}
+        )
+        return response.json()
+
+    missing_ids = [user_id for user_id in dict.fromkeys(user_ids) if avatar_cache.get(user_id) is MISSING]
+
+    await _warm("avatar", avatar_cache, missing_ids)
+    missing_ids = [user_id for user_id in missing_ids if avatar_cache.get(user_id, count=False) is MISSING]
+
+    for result in await gather_chunks(missing_ids, THUMBNAILS_BATCH_SIZE, fetch, concurrency=_batch_concurrency):
+        if not isinstance(result, dict) or "data" not in result:
+            continue # Probably a 429 error, the avatars are requested again next time
+
+        for thumbnail in map(Thumbnail.from_json, result["data"]):
+            if thumbnail.ready:
+                _remember("avatar", avatar_cache, thumbnail.target_id, thumbnail.image_url)
+
+    avatars = {}
+
+    for user_id in user_ids:
+        avatar = avatar_cache.get(user_id, count=False)
+
+        if avatar:
+            avatars[user_id] = avatar
+
+    return avatars
+
+# Avatars requested around the same time are resolved in one request
+_avatar_loader = BatchLoader(_fetch_avatars, delay=0.05, max_size=THUMBNAILS_BATCH_SIZE)
+
+async def get_user_avatars(user_ids: list[int]) -> dict[int, str]:
+    """
+    Get the avatar headshots of ROBLOX users in bulk.
+
+    :param user_ids: The user IDs.
+    :return: The image URL by user ID, users without a ready avatar are left out.
+    """
+
+    return await _fetch_avatars([int(user_id) for user_id in user_ids])
+
+async def get_user_avatar(user_id: str) -> str | None:
+    """
+    Get the avatar headshot of a ROBLOX user.
+
+    Concurrent calls are batched into one request.
+
+    :param user_id: The user ID.
+    :return: The image URL, or None if the avatar isn't ready.
+    """
+
+    avatar = avatar_cache.get(int(user_id))
+
+    if avatar is not MISSING:
+        return avatar
+
+    return await _avatar_loader.load(int(user_id))
 
-async def get_user_presences_by_ids(user_ids: list[int]) -> dict:
+@coalesce(in_flight, key=lambda user_ids: tuple(int(user_id) for user_id in user_ids))
+async def get_user_presences_by_ids(user_ids: list[int]) -> dict[int, UserPresence]:
     """
     Get ROBLOX user presences by IDs.
 
-    :param user_id: The user IDs.
-    :return: The ROBLOX user presences.
+    Any number of IDs is accepted, they are requested in concurrent chunks.
+
+    :param user_ids: The user IDs.
+    :return: The ROBLOX user presences by user ID.
     """
     
     url = "https://presence.roblox.com/v1/presence/users"
-    
-    data = json.dumps({
-        "userIds": user_ids
-    })
 
     headers = {
         "accept": "application/json",
@@ -80,60 +380,36 @@ async def get_user_presences_by_ids(user_ids: list[int]) -> dict:
         "Cookie": f".ROBLOSECURITY={os.getenv('ROBLOX_COOKIE')}"
     }
 
-    response = requests.post(url, headers=headers, data=data)
+    presences = await _post_batches(url, "userPresences", [int(user_id) for user_id in user_ids], PRESENCES_BATCH_SIZE, headers)
 
-    return response.json()
+    return {presence.user_id: presence for presence in map(UserPresence.from_json, presences)}
 
-async def get_user(user_input: str) -> dict:
+async def get_user(user_input: str) -> RobloxUser | None:
     """
     Get the ROBLOX user from the user input.
 
-    :param user_input: The user input.
-    :return: The ROBLOX user.
+    :param user_input: The user input, a user name or #[user id].
+    :return: The ROBLOX user, or None if they don't exist.
     """
-    user_id = None
-    user_name = None
 
     if user_input.startswith("#"):
         user_id = user_input[1:]
 
-        if user_id is not None:
-            user = await get_users_by_ids([int(user_id)])
+        if not user_id.isdigit():
+            return None
 
-            if not user["data"]:
-                return None
+        return (await get_users_by_ids([int(user_id)])).get(int(user_id))
 
-            user = user["data"][0]
-            user_id = user["id"]
-            user_name = user["name"]
-            
-    else:
-        user_name = user_input
-        
-        if user_name is not None:
-            user = await get_user_by_name(user_name)
-
-            if not user["data"]:
-                return None
-            
-            user = user["data"][0]
-            user_id = user["id"]
-            user_name = user["name"]
-    
-    if user_id is None or user_name is None:
-        return None
-    
-    return {
-        "id": user_id,
-        "username": user_name
-    }
+    return await get_user_by_name(user_input)
 
-async def get_user_information(user_id: int) -> dict:
+@coalesce(in_flight, key=lambda user_id, fresh=False: (int(user_id), fresh))
+async def get_user_information(user_id: int, *, fresh: bool = False) -> RobloxUser | None:
     """
-    Get the ROBLOX user information by ID.
+    Get the ROBLOX user information, including the description, by ID.
 
     :param user_id: The user ID.
-    :return: The ROBLOX user information.
+    :param fresh: Whether to skip the cache, e.g. to read a just-edited description.
+    :return: The ROBLOX user, or None if they don't exist.
     """
     
     url = f"https://users.roblox.com/v1/users/{user_id}"
@@ -143,16 +419,36 @@ async def get_user_information(user_id: int) -> dict:
         "Content-Type": "application/json"
     }
 
-    response = requests.get(url, headers=headers)
+    if not fresh:
+        information = information_cache.get(int(user_id))
 
-    return response.json()
+        if information is NOT_FOUND:
+            return None
+        elif information is not MISSING:
+            return information
+
+    response = await _http().get(url, headers=headers)
+
+    if response.status == 404:
+        information_cache.set_not_found(int(user_id))
+        user_cache.set_not_found(int(user_id))
+        return None
+    elif not response.ok:
+        raise _unavailable(url)
 
-async def get_user_groups(user_id: str) -> dict:
+    information = RobloxUser.from_json(response.json())
+    information_cache.set(int(user_id), information)
+    _cache_user(information)
+
+    return information
+
+@coalesce(in_flight, key=lambda user_id: int(user_id))
+async def get_user_groups(user_id: str) -> list[GroupRole]:
     """
     Get the ROBLOX user groups by ID.
 
     :param user_id: The user ID.
-    :return: The ROBLOX user groups.
+    :return: The user's role in every group they are in.
     """
     
     url = f"https://groups.roblox.com/v1/users/{user_id}/groups/roles"
@@ -162,22 +458,173 @@ async def get_user_groups(user_id: str) -> dict:
         "Content-Type": "application/json"
     }
 
-    response = requests.get(url, headers=headers)
+    response = await _http().get(url, headers=headers)
+
+    if response.status in (400, 404): # The user doesn't exist
+        return []
+    elif not response.ok:
+        raise _unavailable(url)
+
+    return [GroupRole.from_json(group) for group in response.json()["data"]]
+
+async def _paginate(
+    url: str, *, params: dict | None = None, data_key: str = "data", cursor_key: str = "nextPageCursor", prefetch: bool = True
+) -> AsyncIterator[dict]:
+    """
+    Follow a cursor-paginated endpoint lazily, yielding one item at a time.
+
+    Only the current page (and, with prefetch, the next one) is held in memory.
+
+    :param url: The endpoint.
+    :param params: (Optional) The query parameters of every page.
+    :param data_key: The key of the item list in a page.
+    :param cursor_key: The key of the next page's cursor in a page.
+    :param prefetch: Whether to request the next page while the current one is processed.
+    """
+
+    async def fetch(cursor: str | None) -> dict:
+        page_params = dict(params or {})
+
+        if cursor:
+            page_params["cursor"] = cursor
+
+        response = await _http().get(url, params=page_params)
+
+        if not response.ok:
+            raise _unavailable(url)
+        return response.json()
+
+    next_page = asyncio.ensure_future(fetch(None))
+
+    try:
+        while next_page is not None:
+            page = await next_page
+            next_page = None
+
+            cursor = page.get(cursor_key)
+
+            if cursor and prefetch:
+                next_page = asyncio.ensure_future(fetch(cursor))
 
-    return response.json()
+            for item in page.get(data_key) or []:
+                yield item
 
-async def get_user_friends(user_id: str) -> list:
+            if cursor and not prefetch:
+                next_page = asyncio.ensure_future(fetch(cursor))
+    finally:
+        if next_page is not None: # The caller stopped early
+            next_page.cancel()
+
+async def iter_user_friends(user_id: str, *, prefetch: bool = True) -> AsyncIterator[RobloxUser]:
     """
-    Get the ROBLOX user friends by ID.
+    Iterate over all the friends of a ROBLOX user, page by page.
 
     :param user_id: The user ID.
+    :param prefetch: Whether to request the next page while the current one is processed.
     """
 
-    url = f"https://friends.roblox.com/v1/users/{user_id}/friends"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()["data"]
-    return []
+    url = f"https://friends.roblox.com/v1/users/{user_id}/friends/find"
+    friend_ids = []
+
+    async for friend in _paginate(url, params={"limit": 50}, data_key="PageItems", cursor_key="NextCursor", prefetch=prefetch):
+        friend_ids.append(int(friend["id"]))
+
+        if len(friend_ids) == 50: # Resolve the names a page at a time
+            for user in (await get_users_by_ids(friend_ids)).values():
+                yield user
+            friend_ids = []
+
+    if friend_ids:
+        for user in (await get_users_by_ids(friend_ids)).values():
+            yield user
+
+@coalesce(in_flight, key=lambda user_id: int(user_id))
+async def get_user_friends(user_id: str) -> list[RobloxUser]:
+    """
+    Get all the ROBLOX user friends by ID.
+
+    :param user_id: The user ID.
+    """
+
+    return [friend async for friend in iter_user_friends(user_id)]
+
+@coalesce(in_flight, key=lambda group_id: int(group_id))
+async def get_group_roles(group_id: str) -> list[GroupRole]:
+    """
+    Get the roles of a ROBLOX group.
+
+    :param group_id: The group ID.
+    :return: The roles, from the lowest rank to the highest.
+    """
+
+    url = f"https://groups.roblox.com/v1/groups/{group_id}/roles"
+    response = await _http().get(url)
+
+    if not response.ok:
+        raise _unavailable(url)
+
+    roles = [GroupRole(int(group_id), int(role["id"]), role["name"], role["rank"]) for role in response.json()["roles"]]
+
+    return sorted(roles, key=lambda role: role.rank)
+
+async def iter_group_members(
+    group_id: str, role_id: str | None = None, *, prefetch: bool = True
+) -> AsyncIterator[tuple[RobloxUser, GroupRole]]:
+    """
+    Iterate over the members of a ROBLOX group, page by page.
+
+    :param group_id: The group ID.
+    :param role_id: (Optional) Only iterate over the members with this role.
+    :param prefetch: Whether to request the next page while the current one is processed.
+    """
+
+    params = {"limit": 100, "sortOrder": "Asc"}
+
+    if role_id is not None:
+        role = next((role for role in await get_group_roles(group_id) if role.id == int(role_id)), None)
+
+        if role is None:
+            return
+
+        url = f"https://groups.roblox.com/v1/groups/{group_id}/roles/{role_id}/users"
+
+        async for member in _paginate(url, params=params, prefetch=prefetch):
+            yield RobloxUser(int(member["userId"]), member["username"], member.get("displayName"), member.get("hasVerifiedBadge", False)), role
+    else:
+        url = f"https://groups.roblox.com/v1/groups/{group_id}/users"
+
+        async for member in _paginate(url, params=params, prefetch=prefetch):
+            user = member["user"]
+            role = member["role"]
+
+            yield (
+                RobloxUser(int(user["userId"]), user["username"], user.get("displayName"), user.get("hasVerifiedBadge", False)),
+                GroupRole(int(group_id), int(role["id"]), role["name"], role["rank"])
+            )
+
+async def iter_community_group_members(
+    bot: commands.Bot, role_ids: list[str] | None = None, *, prefetch: bool = True
+) -> AsyncIterator[tuple[RobloxUser, GroupRole]]:
+    """
+    Iterate over the members of every Shirai Ryu-related ROBLOX group.
+
+    :param bot: The Discord bot.
+    :param role_ids: (Optional) Only iterate over the members with one of these roles.
+    :param prefetch: Whether to request the next page while the current one is processed.
+    """
+
+    for group_id in bot.config["community_groups"]:
+        if role_ids is None:
+            async for member in iter_group_members(group_id, prefetch=prefetch):
+                yield member
+            continue
+
+        group_role_ids = {str(role.id) for role in await get_group_roles(group_id)}
+
+        for role_id in role_ids:
+            if str(role_id) in group_role_ids:
+                async for member in iter_group_members(group_id, role_id, prefetch=prefetch):
+                    yield member
 
 async def profile(user_id: str) -> str:
     """
@@ -189,27 +636,109 @@ async def profile(user_id: str) -> str:
 
     return f"https://www.roblox.com/users/{user_id}/profile"
 
-async def get_community_groups(bot: commands.Bot, user_id: str) -> list:
+def rank_hash(ranks: dict[str, GroupRole]) -> str:
+    """
+    Hash community group ranks, so two rank sets can be compared cheaply.
+
+    :param ranks: The ranks by group ID.
+    :return: The hash.
+    """
+
+    ranks = {group_id: role.to_json() for group_id, role in ranks.items()}
+
+    return hashlib.sha1(json.dumps(ranks, sort_keys=True).encode()).hexdigest()
+
+async def _get_rank_entry(bot: commands.Bot, user_id: str, *, fresh: bool = False) -> dict:
+    """
+    Get a user's cached community group ranks, with their hash.
+
+    :param bot: The Discord bot.
+    :param user_id: The user ID.
+    :param fresh: Whether to skip the cache.
+    :return: The ranks as JSON by group ID, and their hash.
+    """
+
+    if not fresh:
+        entry = group_rank_cache.get(int(user_id))
+
+        if entry is MISSING:
+            await _warm("ranks", group_rank_cache, [int(user_id)])
+            entry = group_rank_cache.get(int(user_id), count=False)
+
+        if entry is not MISSING:
+            return entry
+
+    ranks = {}
+
+    for role in await get_user_groups(user_id):
+        if str(role.group_id) in bot.config["community_groups"]:
+            ranks[str(role.group_id)] = role
+
+    entry = {
+        "ranks": {group_id: role.to_json() for group_id, role in ranks.items()},
+        "hash": rank_hash(ranks),
+    }
+    _remember("ranks", group_rank_cache, int(user_id), entry)
+
+    return entry
+
+async def get_community_ranks(bot: commands.Bot, user_id: str, *, fresh: bool = False) -> dict[str, GroupRole]:
+    """
+    Get a user's ranks in the Shirai Ryu-related ROBLOX groups.
+
+    :param bot: The Discord bot.
+    :param user_id: The user ID.
+    :param fresh: Whether to skip the cache.
+    :return: The user's role by group ID, for the community groups the user is in.
+    """
+
+    entry = await _get_rank_entry(bot, user_id, fresh=fresh)
+
+    return {group_id: GroupRole.from_json(role) for group_id, role in entry["ranks"].items()}
+
+async def has_rank_changed(bot: commands.Bot, user_id: str) -> bool:
+    """
+    Check whether a user's community group ranks changed since they were last synced.
+
+    :param bot: The Discord bot.
+    :param user_id: The user ID.
+    :return: Whether the ranks changed, or were never synced.
+    """
+
+    entry = await _get_rank_entry(bot, user_id)
+
+    return synced_rank_cache.get(int(user_id), count=False) != entry["hash"]
+
+def mark_rank_synced(user_id: str, ranks: dict[str, GroupRole]) -> None:
+    """
+    Remember the ranks that were synced to a user's Discord roles.
+
+    :param user_id: The user ID.
+    :param ranks: The synced ranks by group ID.
+    """
+
+    synced_rank_cache.set(int(user_id), rank_hash(ranks))
+
+async def get_community_groups(bot: commands.Bot, user_id: str, *, fresh: bool = False) -> list[GroupRole]:
     """
     Get Shirai Ryu-related ROBLOX groups by user ID.
 
     :param bot: The Discord bot.
     :param user_id: The user ID.
-    :return: The ROBLOX community groups.
+    :param fresh: Whether to skip the cache.
+    :return: The user's role in every community group they are in.
     """
     
-    groups = await get_user_groups(user_id)
-    groups = groups["data"]
+    ranks = await get_community_ranks(bot, user_id, fresh=fresh)
 
-    community_groups = list(filter(lambda group: str(group["group"]["id"]) in bot.config["community_groups"], groups))
-    
-    return community_groups
+    return list(ranks.values())
 
+@coalesce(in_flight)
 async def get_bloxlink_bind(guild_id: str, discord_id: str) -> dict:
     url = f"https://api.blox.link/v4/public/guilds/{guild_id}/discord-to-roblox/{discord_id}"
 
-    response = requests.get(url, headers = {"Authorization": os.getenv("BLOXLINK_API_TOKEN")})
+    response = await _http().get(url, headers = {"Authorization": os.getenv("BLOXLINK_API_TOKEN")})
 
-    if response.status_code == 200:
+    if response.status == 200:
         return response.json()
     return []
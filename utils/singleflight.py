@@ -0,0 +1,81 @@
+import asyncio
+import functools
+
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight call.
+
+    Every caller that asks for a key while a call for it is running waits for that
+    call and gets its result, or its exception.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn for the key, or join the call already running for it.
+
+        :param key: The resource key.
+        :param fn: The coroutine function doing the actual work.
+        :return: The result of the call.
+        """
+
+        future = self._calls.get(key)
+
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.shared += 1
+
+        # A cancelled waiter must not cancel the call the other waiters share
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+        if not future.cancelled():
+            future.exception() # Mark the exception as retrieved when no one is left waiting
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+        }
+
+def coalesce(group: SingleFlight, key: Callable[..., Hashable] | None = None) -> Callable:
+    """
+    Decorate a coroutine function so concurrent calls with the same key share one call.
+
+    :param group: The single-flight group the calls are coalesced in.
+    :param key: (Optional) Builds the key from the call arguments, defaults to the arguments themselves.
+    :return: The decorator.
+    """
+
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            if key is not None:
+                call_key = (fn.__qualname__, key(*args, **kwargs))
+            else:
+                call_key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+
+            return await group.do(call_key, lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,535 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+
+import discord
+
+from utils.models import UserPresence
+
+logger = logging.getLogger("discord_bot")
+
+EMBEDS_PER_MESSAGE = 10 # Discord allows at most 10 embeds per message
+EMBED_CHARACTERS_PER_MESSAGE = 6000 # and at most 6000 characters over all of them
+
+class TrackerState:
+    """
+    The tracked users kept in memory between tracker checks.
+
+    The tracked_users table is only read again after invalidate() is called, and
+    changed posted rules are queued and written in one statement by flush().
+    """
+
+    def __init__(self, database) -> None:
+        """
+        :param database: The database manager.
+        """
+        self.database = database
+        self.users: dict[int, dict] = {} # roblox_id -> tracked_users row
+        self.reloads = 0
+        self._stale = True
+        self._presences: dict[int, tuple] = {} # roblox_id -> presence seen last check
+        self._pending: dict[int, str | None] = {} # roblox_id -> posted rule to write
+        self._history: list[tuple[int, int, int | None, float]] = [] # Presence transitions to write
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def invalidate(self) -> None:
+        """
+        Read the tracked users from the database again on the next check.
+        """
+
+        self._stale = True
+
+    async def load(self) -> dict[int, dict]:
+        """
+        Get the tracked users, reading them from the database only if they changed.
+
+        :return: The tracked users by ROBLOX ID.
+        """
+
+        if self._stale:
+            self._stale = False # Set first, so an invalidation while reading isn't lost
+
+            try:
+                rows = await self.database.get_tracked_users()
+            except Exception:
+                self._stale = True
+                raise
+
+            self.users = {int(row["roblox_id"]): row for row in rows}
+            self.reloads += 1
+
+            for roblox_id in list(self._presences):
+                if roblox_id not in self.users:
+                    del self._presences[roblox_id]
+
+        return self.users
+
+    def apply(self, change: dict) -> None:
+        """
+        Apply a change notified by the database.
+
+        :param change: The change, see DatabaseManager.add_change_listener.
+        """
+
+        if change["op"] == "RESET":
+            self.invalidate()
+            return
+
+        if change["table"] != "tracked_users":
+            return
+
+        if change["op"] == "DELETE":
+            roblox_id = int(change["old"]["roblox_id"])
+
+            self.users.pop(roblox_id, None)
+            self._presences.pop(roblox_id, None)
+            self._pending.pop(roblox_id, None)
+            return
+
+        if change["op"] == "UPDATE":
+            old, new = change["old"], change["new"]
+            user = self.users.get(int(new["roblox_id"]))
+
+            if user is not None and old["roblox_id"] == new["roblox_id"] and {**old, "posted": new["posted"], "posted_rule": new["posted_rule"]} == new:
+                if int(new["roblox_id"]) not in self._pending: # Ignore the echo of an older write
+                    user["posted"] = new["posted"]
+                    user["posted_rule"] = new["posted_rule"]
+                return
+
+        self.invalidate() # New rows need the columns left out of notifications
+
+    def changed(self, presence: UserPresence) -> bool:
+        """
+        Compare a presence with the one seen in the previous check.
+
+        :param presence: The user's presence.
+        :return: Whether the presence changed, or is seen for the first time.
+        """
+
+        state = (presence.type, presence.root_place_id)
+
+        if self._presences.get(presence.user_id) == state:
+            return False
+
+        self._presences[presence.user_id] = state
+        self._history.append((presence.user_id, presence.type, presence.root_place_id, time.time()))
+        return True
+
+    def set_posted(self, roblox_id: int, rule: str | None) -> None:
+        """
+        Change the watch rule a user is posted under, to be written on the next flush.
+
+        :param roblox_id: The user ID.
+        :param rule: The name of the rule, or None if the user isn't posted.
+        """
+
+        user = self.users.get(roblox_id)
+
+        if user is None or (user["posted"], user["posted_rule"]) == (rule is not None, rule):
+            return
+
+        user["posted"] = rule is not None
+        user["posted_rule"] = rule
+        self._pending[roblox_id] = rule
+
+    async def flush(self) -> None:
+        """
+        Write every changed posted rule and presence transition in one batch each.
+        """
+
+        history, self._history = self._history, []
+
+        if history:
+            try:
+                await self.database.add_presence_history(history)
+            except Exception:
+                self._history[:0] = history[-10_000:] # Retry with the next flush, within reason
+                raise
+
+        pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        try:
+            await self.database.set_tracked_users_posted([(str(roblox_id), rule) for roblox_id, rule in pending.items()])
+        except Exception:
+            for roblox_id, rule in pending.items(): # Retry with the next flush, unless changed since
+                self._pending.setdefault(roblox_id, rule)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self.users),
+            "pending": len(self._pending) + len(self._history),
+            "reloads": self.reloads,
+        }
+
+class PollScheduler:
+    """
+    Gives every tracked user their own next poll deadline.
+
+    Users who are in a game or just changed presence are polled every min_interval
+    seconds. Users who are online elsewhere are polled every base_interval seconds,
+    and offline users back off from there up to max_interval seconds.
+
+    Users are split into shards by ID, and the first poll of every shard is offset
+    evenly across base_interval, so a large watchlist isn't polled all at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_interval: float = 15.0,
+        base_interval: float = 60.0,
+        max_interval: float = 300.0,
+        batch_size: int = 50,
+        shards: int = 1,
+        max_batches: int = 4
+    ) -> None:
+        """
+        :param min_interval: The time in seconds between polls of active users.
+        :param base_interval: The time in seconds between polls of idle users.
+        :param max_interval: The maximum time in seconds between polls of offline users.
+        :param batch_size: The number of users polled per presence request.
+        :param shards: The number of shards the first polls are spread over.
+        :param max_batches: The maximum number of presence requests per tick, the rest wait for the next one.
+        """
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.shards = max(1, shards)
+        self.max_batches = max(1, max_batches)
+        self.polls = 0
+        self.cycles = 0
+        self.overruns = 0
+        self.last_cycle = 0.0
+        self.max_cycle = 0.0
+        self._total_cycle = 0.0
+        self._deadlines: dict[int, float] = {} # roblox_id -> time of the next poll
+        self._intervals: dict[int, float] = {} # roblox_id -> time between the last two polls
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def sync(self, roblox_ids) -> None:
+        """
+        Schedule newly tracked users right away and forget untracked ones.
+
+        :param roblox_ids: The IDs of every tracked user.
+        """
+
+        roblox_ids = set(roblox_ids)
+        now = time.monotonic()
+
+        for roblox_id in list(self._deadlines):
+            if roblox_id not in roblox_ids:
+                del self._deadlines[roblox_id]
+                self._intervals.pop(roblox_id, None)
+
+        for roblox_id in roblox_ids:
+            if roblox_id not in self._deadlines:
+                self._deadlines[roblox_id] = now + self.shard(roblox_id) * self.base_interval / self.shards
+
+    def shard(self, roblox_id: int) -> int:
+        return roblox_id % self.shards
+
+    def due(self) -> list[int]:
+        """
+        Get the users to poll now.
+
+        The last presence request is filled up with the users due soonest, since a
+        full request costs the same as a partial one. At most max_batches requests
+        worth of users are returned, the most overdue first.
+
+        :return: The user IDs, soonest deadline first.
+        """
+
+        now = time.monotonic()
+        queue = sorted(self._deadlines, key=self._deadlines.get)
+        due = 0
+
+        while due < len(queue) and self._deadlines[queue[due]] <= now:
+            due += 1
+
+        if not due:
+            return []
+
+        batches = min(-(-due // self.batch_size), self.max_batches)
+
+        return queue[:batches * self.batch_size]
+
+    def record(self, presence: UserPresence | None, *, changed: bool) -> None:
+        """
+        Schedule the next poll of a user from their latest presence.
+
+        :param presence: The user's presence, or None if it wasn't returned.
+        :param changed: Whether the presence changed since the previous poll.
+        """
+
+        if presence is None:
+            return
+
+        roblox_id = presence.user_id
+
+        if roblox_id not in self._deadlines:
+            return
+
+        if changed or presence.in_game:
+            interval = self.min_interval
+        elif presence.type != UserPresence.OFFLINE:
+            interval = self.base_interval
+        else: # Back off while the user stays offline
+            interval = min(self.max_interval, max(self.base_interval, self._intervals.get(roblox_id, 0) * 2))
+
+        self._intervals[roblox_id] = interval
+        self._deadlines[roblox_id] = time.monotonic() + interval
+        self.polls += 1
+
+    def postpone(self, roblox_ids: list[int]) -> None:
+        """
+        Poll users again after base_interval seconds, ex. when they weren't returned.
+
+        :param roblox_ids: The user IDs.
+        """
+
+        deadline = time.monotonic() + self.base_interval
+
+        for roblox_id in roblox_ids:
+            if roblox_id in self._deadlines:
+                self._deadlines[roblox_id] = deadline
+
+    def record_cycle(self, duration: float, interval: float) -> None:
+        """
+        Record how long a tick took.
+
+        :param duration: The time in seconds the tick took.
+        :param interval: The time in seconds between ticks.
+        """
+
+        self.cycles += 1
+        self.last_cycle = duration
+        self.max_cycle = max(self.max_cycle, duration)
+        self._total_cycle += duration
+
+        if duration > interval: # The next tick was due before this one finished
+            self.overruns += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        shards = [0] * self.shards
+
+        for roblox_id in self._deadlines:
+            shards[self.shard(roblox_id)] += 1
+
+        return {
+            "scheduled": len(self._deadlines),
+            "due": sum(1 for deadline in self._deadlines.values() if deadline <= now),
+            "active": sum(1 for interval in self._intervals.values() if interval <= self.min_interval),
+            "polls": self.polls,
+            "shards": shards,
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "last_cycle": self.last_cycle,
+            "average_cycle": self._total_cycle / self.cycles if self.cycles else 0.0,
+            "max_cycle": self.max_cycle,
+        }
+
+class TrackerNotifier:
+    """
+    Posts tracker embeds from a bounded queue, off the polling loop.
+
+    Embeds queued around the same time for the same channel are packed into as
+    few messages as possible, with one role mention per message.
+    """
+
+    def __init__(self, bot: discord.Client, *, maxsize: int = 100) -> None:
+        """
+        :param bot: The Discord bot.
+        :param maxsize: The maximum number of queued embeds, the oldest are dropped past it.
+        """
+        self.bot = bot
+        self.maxsize = maxsize
+        self.messages = 0
+        self.embeds = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: deque[tuple[int, str | None, discord.Embed]] = deque()
+        self._ready = asyncio.Event()
+        self._sender: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.ensure_future(self._send_loop())
+
+    async def close(self) -> None:
+        """
+        Stop sending in the background and send everything still queued.
+        """
+
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+
+        while self._queue:
+            await self._send(*self._take())
+
+    def put(self, channel_id: int, embeds: list[discord.Embed], *, content: str | None = None) -> None:
+        """
+        Queue embeds to be posted.
+
+        :param channel_id: The ID of the channel to post in.
+        :param embeds: The embeds, in posting order.
+        :param content: (Optional) The content of the message, ex. a role mention.
+        """
+
+        for embed in embeds:
+            if len(self._queue) >= self.maxsize: # Keep the newest transitions
+                self._queue.popleft()
+                self.dropped += 1
+
+            self._queue.append((channel_id, content, embed))
+
+        if self._queue:
+            self._ready.set()
+
+    def _take(self) -> tuple[int, str | None, list[discord.Embed]]:
+        channel_id, content, embed = self._queue.popleft()
+        embeds = [embed]
+        characters = len(embed)
+
+        # Pack the following embeds for the same channel and mention into the same message, within Discord's limits
+        while len(embeds) < EMBEDS_PER_MESSAGE and self._queue and self._queue[0][:2] == (channel_id, content):
+            if characters + len(self._queue[0][2]) > EMBED_CHARACTERS_PER_MESSAGE:
+                break
+
+            embed = self._queue.popleft()[2]
+            embeds.append(embed)
+            characters += len(embed)
+
+        return channel_id, content, embeds
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._ready.wait()
+
+            while self._queue:
+                await self._send(*self._take())
+
+            self._ready.clear()
+
+    async def _send(self, channel_id: int, content: str | None, embeds: list[discord.Embed]) -> None:
+        try:
+            channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+            await channel.send(content=content, embeds=embeds)
+        except Exception as e: # Anything escaping would end the send loop and leave the queue to fill
+            self.failed += len(embeds)
+            logger.error(f"Could not post {len(embeds)} tracker embeds: {e}")
+            return
+
+        self.messages += 1
+        self.embeds += len(embeds)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "messages": self.messages,
+            "embeds": self.embeds,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+class WatchRule:
+    """
+    A named set of places or universes whose players are posted, from config.json.
+    """
+
+    __slots__ = ("name", "place_ids", "universe_ids", "joins_off", "channel_id", "ping")
+
+    def __init__(
+        self,
+        name: str,
+        channel_id: int,
+        *,
+        place_ids: list[int] | None = None,
+        universe_ids: list[int] | None = None,
+        joins_off: bool = False,
+        ping: str | None = None
+    ) -> None:
+        self.name = name
+        self.channel_id = channel_id
+        self.place_ids = place_ids or []
+        self.universe_ids = universe_ids or []
+        self.joins_off = joins_off # Matches players whose joins are off, so their game is unknown
+        self.ping = ping # The ID of the role to mention
+
+    def __repr__(self) -> str:
+        return f"<WatchRule name={self.name!r}>"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "WatchRule":
+        return cls(
+            name=data["name"],
+            channel_id=int(data["channel"]),
+            place_ids=[int(place_id) for place_id in data.get("places", [])],
+            universe_ids=[int(universe_id) for universe_id in data.get("universes", [])],
+            joins_off=data.get("joins_off", False),
+            ping=data.get("ping"),
+        )
+
+    @property
+    def mention(self) -> str | None:
+        return f"<@&{self.ping}>" if self.ping else None
+
+    def playing(self) -> str:
+        return "is playing a game. Their joins are off." if self.joins_off else f"is playing {self.name}."
+
+    def left(self) -> str:
+        return "has left their game." if self.joins_off else f"has left {self.name}."
+
+class WatchRules:
+    """
+    Classifies presences against every watch rule with dict lookups.
+    """
+
+    def __init__(self, rules: list[WatchRule]) -> None:
+        self.rules = {rule.name: rule for rule in rules}
+        self._by_place: dict[int, WatchRule] = {}
+        self._by_universe: dict[int, WatchRule] = {}
+        self.joins_off: WatchRule | None = None
+
+        for rule in rules:
+            for place_id in rule.place_ids:
+                self._by_place.setdefault(place_id, rule)
+            for universe_id in rule.universe_ids:
+                self._by_universe.setdefault(universe_id, rule)
+            if rule.joins_off and self.joins_off is None:
+                self.joins_off = rule
+
+    @classmethod
+    def from_json(cls, data: list[dict]) -> "WatchRules":
+        return cls([WatchRule.from_json(rule) for rule in data])
+
+    def get(self, name: str | None) -> WatchRule | None:
+        return self.rules.get(name) if name else None
+
+    def classify(self, presence: UserPresence) -> WatchRule | None:
+        """
+        Get the rule a presence matches.
+
+        :param presence: The user's presence.
+        :return: The rule, or None if the user isn't in a watched game.
+        """
+
+        if not presence.in_game:
+            return
+
+        if presence.root_place_id is None:
+            return self.joins_off
+
+        return self._by_place.get(presence.root_place_id) or self._by_universe.get(presence.universe_id)